@@ -1,100 +1,108 @@
-import os
+import argparse
+import logging
 import re
-import subprocess
-import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import core
+import lrc
+import metrics
+from manifest import TrackRecord, append_record
+
 def sanitize_filename(name):
     """清理非法文件名字符"""
     return re.sub(r'[\\/*?:"<>|]', '_', name).strip()
 
-def parse_core_output(output):
-    """解析core.py输出并提取关键信息"""
-    patterns = {
-        'album': r'专辑名称:\s*(.+?)\n',
-        'song': r'歌曲名称:\s*(.+?)\n',
-        'lyrics': r'歌词:\s*((?:\[.+\].+?\n)+)',
-        'trans_lyrics': r'翻译歌词:\s*((?:\[.+\].+?\n)+)'
-    }
-    
-    result = {}
-    for key, pattern in patterns.items():
-        match = re.search(pattern, output, re.DOTALL)
-        if match:
-            result[key] = match.group(1).strip()
-    return result
-
-def process_song(index, song_id):
-    """处理单个歌曲ID"""
-    cmd = [
-        sys.executable,
-        "core.py",
-        "--mode", "gui",
-        "--url", f"https://music.163.com/#/song?id={song_id}",
-        "--level", "hires"
-    ]
-    
+# 每次批量解析的歌曲数
+BATCH_SIZE = 50
+
+def resolve_batch(batch, level, cookies):
+    """在进程内批量解析一组 (序号, 歌曲ID)，返回成功歌曲的 [(专辑目录, 记录)]"""
     try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True,
-            timeout=30
-        )
-        output = result.stdout
+        with metrics.stage_timer('resolve_batch', songs=len(batch)):
+            resolved = core.resolve_songs([song_id for _, song_id in batch], level, cookies)
     except Exception as e:
-        output = f"Error processing {song_id}: {str(e)}"
-    
-    # 解析输出内容
-    data = parse_core_output(output)
-    if not data.get('album') or not data.get('song'):
-        return False
-    
+        print(f"Error processing {[song_id for _, song_id in batch]}: {str(e)}")
+        return []
+
+    records = []
+    for index, song_id in batch:
+        urlv1, detail, lyricv1 = resolved[str(song_id)]
+        if urlv1 is None or urlv1['url'] is None or detail is None or lyricv1 is None:
+            print(f"Error processing {song_id}: 信息获取不完整")
+            continue
+        records.append(build_record(index, song_id, urlv1, detail, lyricv1))
+    return records
+
+def process_batch(batch, level, cookies):
+    """批量解析并写入专辑清单，返回成功数量"""
+    records = resolve_batch(batch, level, cookies)
+    for album_dir, record in records:
+        append_record(album_dir, record)
+    return len(records)
+
+def build_record(index, song_id, urlv1, detail, lyricv1):
+    """生成单曲记录并写出歌词文件，返回 (专辑目录, 记录)"""
     # 创建专辑目录
-    album_dir = Path("temp") / sanitize_filename(data['album'])
+    album_dir = Path("temp") / sanitize_filename(detail['album'])
     album_dir.mkdir(parents=True, exist_ok=True)
-    
-    # 生成带序号的文件名
+
     seq = f"{index:02d}"
-    filename = f"{seq} {sanitize_filename(data['song'])}.temp"
-    
-    # 写入完整数据
-    with open(album_dir / filename, "w", encoding="utf-8") as f:
-        f.write(output)
-    
-    # 单独保存歌词文件
-    if data.get('lyrics'):
-        with open(album_dir / f"{seq} 歌词.lrc", "w", encoding="utf-8") as f:
-            f.write(data['lyrics'])
-    
-    if data.get('trans_lyrics'):
-        with open(album_dir / f"{seq} 翻译歌词.lrc", "w", encoding="utf-8") as f:
-            f.write(data['trans_lyrics'])
-    
-    return True
-
-def main():
+    record = TrackRecord(
+        id=str(song_id),
+        track=index,
+        title=detail['name'],
+        artists=detail['artists'],
+        album=detail['album'],
+        picUrl=detail['picUrl'],
+        url=urlv1['url'],
+        level=urlv1['level'],
+        size=urlv1['size'],
+        md5=urlv1.get('md5'),
+    )
+
+    # 单独保存歌词文件，翻译歌词按时间戳与原文合并为双语 LRC
+    lines = lrc.parse_lyric(lyricv1)
+    if lines:
+        record.lyric_path = f"{seq} 歌词.lrc"
+        lrc.write_lrc(album_dir / record.lyric_path, lines)
+
+    if any(line.translation for line in lines):
+        record.tlyric_path = f"{seq} 翻译歌词.lrc"
+        lrc.write_lrc(album_dir / record.tlyric_path, lines, with_translation=True)
+
+    return album_dir, record
+
+def main(workers=4, level='hires', batch_size=BATCH_SIZE):
     # 确保temp目录存在
     Path("temp").mkdir(exist_ok=True)
-    
+
     try:
         with open("temp.txt", "r+", encoding="utf-8") as f:
             song_ids = [line.strip() for line in f if line.strip()]
-            
-            # 处理所有ID
-            success_count = 0
-            for idx, song_id in enumerate(song_ids, 1):
-                if process_song(idx, song_id):
-                    success_count += 1
-                
+
+            # 多个批次交给线程池并行处理，Cookie 只读取一次
+            cookies = core.cookie_store.get()
+            indexed = list(enumerate(song_ids, 1))
+            batches = [indexed[start:start + batch_size] for start in range(0, len(indexed), batch_size)]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                success_count = sum(pool.map(lambda batch: process_batch(batch, level, cookies), batches))
+
             # 清空文件内容
             f.seek(0)
             f.truncate()
-            
+
         print(f"处理完成，成功处理 {success_count}/{len(song_ids)} 首歌曲")
     except FileNotFoundError:
         print("错误：temp.txt 文件不存在")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="解析 temp.txt 中的歌曲ID")
+    parser.add_argument('--workers', type=int, default=4, help="并行处理的批次数，默认 4")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f"每批解析的歌曲数，默认 {BATCH_SIZE}")
+    parser.add_argument('--level', default='hires', choices=['standard', 'exhigh', 'lossless', 'hires', 'sky', 'jyeffect', 'jymaster'], help="选择音质等级，默认是 hires")
+    parser.add_argument('--log-timers', action='store_true', help="以 JSON 日志输出各批次解析耗时")
+    args = parser.parse_args()
+    if args.log_timers:
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+    main(args.workers, args.level, args.batch_size)
@@ -0,0 +1,66 @@
+"""eapi 签名微基准：对比旧的逐次构造 Cipher / 逐字节 hex 实现与 EapiSigner
+
+用法：python benchmarks/bench_eapi.py [--count 20000] [--batch 50]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.parse
+from hashlib import md5
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from eapi import EapiSigner
+
+URL = "https://interface3.music.163.com/eapi/song/enhance/player/url/v1"
+
+def legacy_sign(url, payload):
+    """改造前 core.url_v1 中的签名实现"""
+    AES_KEY = b"e82ckenh8dichen8"
+    HexDigest = lambda data: "".join([hex(d)[2:].zfill(2) for d in data])
+    url2 = urllib.parse.urlparse(url).path.replace("/eapi/", "/api/")
+    digest = HexDigest(md5(f"nobody{url2}use{json.dumps(payload)}md5forencrypt".encode("utf-8")).digest())
+    params = f"{url2}-36cd479b6b5-{json.dumps(payload)}-36cd479b6b5-{digest}"
+    padder = padding.PKCS7(algorithms.AES(AES_KEY).block_size).padder()
+    padded_data = padder.update(params.encode()) + padder.finalize()
+    cipher = Cipher(algorithms.AES(AES_KEY), modes.ECB())
+    encryptor = cipher.encryptor()
+    enc = encryptor.update(padded_data) + encryptor.finalize()
+    return HexDigest(enc)
+
+def make_payload(i):
+    header = {"os": "pc", "appver": "", "osver": "", "deviceId": "pyncm!", "requestId": str(20000000 + i)}
+    return {'ids': [str(1000000 + i)], 'level': 'hires', 'encodeType': 'flac', 'header': json.dumps(header)}
+
+def rate(func, count):
+    start = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="eapi 签名基准测试")
+    parser.add_argument('--count', type=int, default=20000, help="签名次数")
+    parser.add_argument('--batch', type=int, default=50, help="批量签名时每批的负载数")
+    args = parser.parse_args()
+
+    signer = EapiSigner()
+    payloads = [make_payload(i) for i in range(args.count)]
+    assert all(legacy_sign(URL, p) == signer.sign(URL, p) for p in payloads[:100]), "签名结果不一致"
+
+    batches = [payloads[i:i + args.batch] for i in range(0, len(payloads), args.batch)]
+    results = {
+        '旧实现': rate(lambda: [legacy_sign(URL, p) for p in payloads], args.count),
+        'EapiSigner.sign': rate(lambda: [signer.sign(URL, p) for p in payloads], args.count),
+        'EapiSigner.sign_batch': rate(lambda: [signer.sign_batch(URL, b) for b in batches], args.count),
+    }
+    baseline = results['旧实现']
+    for name, value in results.items():
+        print(f"{name:<24}{value:>12,.0f} 次/秒  ({value / baseline:.2f}x)")
+
+if __name__ == '__main__':
+    main()
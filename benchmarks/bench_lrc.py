@@ -0,0 +1,46 @@
+"""对比旧的正则歌词提取与 lrc 模块的线性解析
+
+用法：python benchmarks/bench_lrc.py [--lines 5000] [--repeat 20]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lrc
+
+# analyser.parse_core_output 原先使用的歌词正则
+OLD_PATTERN = r'歌词:\s*((?:\[.+\].+?\n)+)'
+
+def make_lyric(count, prefix):
+    return '\n'.join(
+        f"[{i // 6000:02d}:{i // 100 % 60:02d}.{i % 100:02d}]{prefix} 第{i}行歌词 " + 'la' * (i % 17)
+        for i in range(count)
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="歌词解析基准测试")
+    parser.add_argument('--lines', type=int, default=5000, help="歌词行数")
+    parser.add_argument('--repeat', type=int, default=20, help="重复次数")
+    args = parser.parse_args()
+
+    lyric = make_lyric(args.lines, 'original')
+    tlyric = make_lyric(args.lines, 'translated')
+    # 旧流程需要先把歌词嵌在 start_gui 的文本输出里再抓取
+    output = f"        歌词: {lyric}\n        翻译歌词: {tlyric}\n        "
+    lyricv1 = {'lrc': {'lyric': lyric}, 'tlyric': {'lyric': tlyric}}
+
+    old = timeit.timeit(lambda: re.search(OLD_PATTERN, output, re.DOTALL), number=args.repeat)
+    new = timeit.timeit(lambda: lrc.parse_lyric(lyricv1), number=args.repeat)
+    old_ok = re.search(OLD_PATTERN, output, re.DOTALL).group(1).strip() == lyric
+    new_ok = len(lrc.parse_lyric(lyricv1)) == args.lines
+
+    print(f"歌词行数: {args.lines}，重复 {args.repeat} 次")
+    print(f"正则提取: {old / args.repeat * 1000:.2f} ms/次（仅提取文本，未合并翻译），结果正确: {old_ok}")
+    print(f"线性解析: {new / args.repeat * 1000:.2f} ms/次（解析并合并翻译），结果正确: {new_ok}")
+
+if __name__ == '__main__':
+    main()
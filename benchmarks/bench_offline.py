@@ -0,0 +1,207 @@
+"""离线基准测试：在本地接口替身上测量 /Song_V1 吞吐、analyser 解析速率与 downloader 下载速度
+
+所有文件写在临时目录中，不会改动项目下的 cookie.txt、temp/ 与 result/。
+结果以 JSON 写出，指定 --compare 时与上一次的结果逐项对比。
+
+用法：python benchmarks/bench_offline.py [--requests 500] [--albums 10] [--latency 0.02] \
+          [--output bench.json] [--compare 上次结果.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import mock_server
+
+# 对比时每项指标的方向：True 表示越大越好
+HEADLINE = {
+    ('song_v1', 'requests_per_second'): True,
+    ('song_v1', 'p95_ms'): False,
+    ('analyser', 'songs_per_second'): True,
+    ('downloader', 'mb_per_second'): True,
+}
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def bench_song_v1(core, base, total, concurrency, short_link_every):
+    """用真实 HTTP 请求压测 /Song_V1；每 short_link_every 个请求走一次短链接"""
+    import requests
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, core.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = f"http://127.0.0.1:{server.server_port}/Song_V1"
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def call(i):
+        # 歌曲 ID 不重复，测量的是未命中缓存时的完整链路
+        song_id = 900000 + i
+        params = {'level': 'lossless', 'type': 'json'}
+        if short_link_every and i % short_link_every == 0:
+            params['url'] = f"{base}/163cn.tv/{song_id}"
+        else:
+            params['ids'] = str(song_id)
+        start = time.perf_counter()
+        response = session.get(api, params=params, timeout=30)
+        return time.perf_counter() - start, response.status_code == 200 and response.json().get('status') == 200
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(total)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    latencies = [latency * 1000 for latency, _ in results]
+    return {
+        'requests': total,
+        'errors': sum(1 for _, ok in results if not ok),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(total / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+    }
+
+def bench_analyser(spider, analyser, albums, workers, batch_size):
+    """展开专辑写入 temp.txt，再由 analyser 解析并生成清单"""
+    start = time.perf_counter()
+    song_ids = []
+    for album_id in range(1, albums + 1):
+        song_ids.extend(spider.process_album(f"https://music.163.com/#/album?id={album_id}"))
+    expand_seconds = time.perf_counter() - start
+
+    Path('temp.txt').write_text('\n'.join(song_ids), encoding='utf-8')
+    start = time.perf_counter()
+    analyser.main(workers, 'lossless', batch_size)
+    elapsed = time.perf_counter() - start
+    return {
+        'albums': albums,
+        'songs': len(song_ids),
+        'expand_seconds': round(expand_seconds, 3),
+        'seconds': round(elapsed, 3),
+        'songs_per_second': round(len(song_ids) / elapsed, 1),
+    }
+
+def bench_downloader(downloader_module, workers, per_host, album_workers):
+    """下载 analyser 生成的全部专辑"""
+    downloader = downloader_module.NeteaseDownloader(max_workers=workers, per_host=per_host)
+    start = time.perf_counter()
+    downloader.run(album_workers)
+    elapsed = time.perf_counter() - start
+    mb = downloader.downloaded_bytes / 1024 / 1024
+    files = sum(1 for path in Path('result').rglob('*') if path.suffix in ('.flac', '.mp3'))
+    return {
+        'files': files,
+        'megabytes': round(mb, 2),
+        'seconds': round(elapsed, 3),
+        'mb_per_second': round(mb / elapsed, 2),
+        'download_seconds': round(downloader.stage_times['download'], 3),
+        'tag_seconds': round(downloader.stage_times['tag'], 3),
+    }
+
+def compare(previous, current):
+    """打印主要指标相对上一次结果的变化"""
+    print("\n与上次结果对比:")
+    for (section, key), higher_is_better in HEADLINE.items():
+        old = previous.get('results', {}).get(section, {}).get(key)
+        new = current['results'].get(section, {}).get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        better = (change > 0) == higher_is_better
+        print(f"  {section}.{key:<22}{old:>10} -> {new:<10} ({change:+.1f}%{'' if abs(change) < 1 else (' 提升' if better else ' 退化')})")
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument('--requests', type=int, default=500, help="/Song_V1 请求数，默认 500")
+    parser.add_argument('--concurrency', type=int, default=16, help="/Song_V1 并发客户端数，默认 16")
+    parser.add_argument('--short-link-every', type=int, default=4, help="每 N 个请求使用一次短链接，0 表示不使用")
+    parser.add_argument('--albums', type=int, default=10, help="analyser/downloader 处理的专辑数，默认 10")
+    parser.add_argument('--analyser-workers', type=int, default=4, help="analyser 并行批次数")
+    parser.add_argument('--batch-size', type=int, default=50, help="analyser 每批歌曲数")
+    parser.add_argument('--download-workers', type=int, default=8, help="downloader 并发下载数")
+    parser.add_argument('--per-host', type=int, default=8, help="downloader 单主机并发数")
+    parser.add_argument('--album-workers', type=int, default=2, help="downloader 同时处理的专辑数")
+    parser.add_argument('--pool-size', type=int, default=20, help="core 上游连接池大小，默认与 core.py 相同")
+    parser.add_argument('--latency', type=float, default=0.02, help="替身接口延迟（秒），默认 0.02")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="替身返回限流响应的比例")
+    parser.add_argument('--bandwidth', type=float, default=0.0, help="每个 CDN 连接的带宽（MB/s），0 表示不限")
+    parser.add_argument('--track-size', type=int, default=4, help="合成音频大小（MB），默认 4")
+    parser.add_argument('--with-limits', action='store_true', help="保留生产环境的限流配置；默认放开以测量代码本身")
+    parser.add_argument('--skip', action='append', default=[], choices=['song_v1', 'analyser', 'downloader'], help="跳过某项测试")
+    parser.add_argument('--output', default='bench.json', help="结果文件，默认 bench.json")
+    parser.add_argument('--compare', help="上一次的结果文件")
+    args = parser.parse_args()
+    output = Path(args.output).resolve()
+    previous = json.loads(Path(args.compare).read_text(encoding='utf-8')) if args.compare else None
+
+    mock, base = mock_server.start(
+        latency=args.latency, error_rate=args.error_rate,
+        bandwidth=args.bandwidth * 1024 * 1024, track_size=args.track_size * 1024 * 1024,
+    )
+    workdir = tempfile.mkdtemp(prefix='netease-bench-')
+    os.chdir(workdir)
+    Path('cookie.txt').write_text('MUSIC_U=mock; __csrf=mock', encoding='utf-8')
+    # 上游地址与凭据文件在模块导入时读取，必须先设置环境变量
+    os.environ.update({
+        'NETEASE_API_BASE': base,
+        'NETEASE_WEB_BASE': base,
+        'NETEASE_COOKIE_FILE': str(Path('cookie.txt').resolve()),
+    })
+    os.environ.pop('NETEASE_RATE_DB', None)
+
+    import analyser
+    import core
+    import downloader
+    import ratelimit
+    import spider
+
+    core.init_client(pool_size=args.pool_size)
+    if not args.with_limits:
+        unlimited = ratelimit.Limit(1e6, 1e6, 1e6)
+        ratelimit.limiter.limits = {family: unlimited for family in ratelimit.limiter.limits}
+
+    results = {}
+    if 'song_v1' not in args.skip:
+        print("测试 /Song_V1 ...")
+        results['song_v1'] = bench_song_v1(core, base, args.requests, args.concurrency, args.short_link_every)
+    if 'analyser' not in args.skip:
+        print("测试 analyser ...")
+        results['analyser'] = bench_analyser(spider, analyser, args.albums, args.analyser_workers, args.batch_size)
+    if 'downloader' not in args.skip and 'analyser' not in args.skip:
+        print("测试 downloader ...")
+        results['downloader'] = bench_downloader(downloader, args.download_workers, args.per_host, args.album_workers)
+    mock.shutdown()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'upstream_calls': dict(mock.RequestHandlerClass.config.counts),
+        'results': results,
+    }
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    print(f"结果已写入 {output}（工作目录 {workdir}）")
+    if previous:
+        compare(previous, report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""本地网易云接口替身，供离线基准测试使用
+
+实现本项目用到的接口：eapi 播放链接（真实解密 params）、song/detail、lyric、album/{id}、歌单详情、
+网页端播放链接、账号信息、163cn.tv 短链接跳转、封面与合成的 FLAC/MP3 音频 CDN。
+可配置延迟、错误率与带宽；错误以限流响应返回（接口 code -460，CDN 为 HTTP 503）。
+
+歌曲 ID 约定：专辑 A 的第 i 首歌为 A*100+i，因此任意歌曲 ID 整除 100 即为所属专辑。
+
+用法：python benchmarks/mock_server.py [--port 8163] [--latency 0.02] [--error-rate 0] [--bandwidth 0]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eapi import signer
+
+TRACKS_PER_ALBUM = 12
+PLAYLIST_ALBUMS = 5
+LOSSY_LEVELS = ('standard', 'exhigh')
+
+# 最小的 JPEG（SOI + EOI），足够作为封面字节
+COVER_BYTES = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xd9'
+
+def synthetic_flac(size):
+    """带合法 STREAMINFO 的 FLAC 头 + 填充数据，mutagen 可以正常写入标签"""
+    total_samples = 44100 * 180
+    streaminfo = struct.pack('>HH', 4096, 4096) + b'\x00' * 6
+    # 采样率 20 位、声道数-1 3 位、位深-1 5 位、总采样数 36 位
+    packed = (44100 << 44) | (1 << 41) | (15 << 36) | total_samples
+    streaminfo += packed.to_bytes(8, 'big') + b'\x00' * 16
+    header = b'fLaC' + bytes([0x80]) + len(streaminfo).to_bytes(3, 'big') + streaminfo
+    return header + _filler(size - len(header))
+
+def synthetic_mp3(size):
+    """以 MPEG 帧同步字节开头的填充数据"""
+    frame = b'\xff\xfb\x90\x64'
+    return frame + _filler(size - len(frame))
+
+def _filler(size):
+    block = hashlib.sha256(b'mock').digest() * 2048
+    return (block * (size // len(block) + 1))[:max(size, 0)]
+
+class MockConfig:
+    def __init__(self, latency=0.0, error_rate=0.0, bandwidth=0.0, track_size=4 * 1024 * 1024):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.bandwidth = bandwidth  # 每个连接的字节/秒，0 表示不限
+        self.track_size = track_size
+        self._audio = {}
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def audio(self, ext):
+        """返回 (字节, md5)，同一格式的所有歌曲共用一份内容"""
+        with self._lock:
+            if ext not in self._audio:
+                data = synthetic_flac(self.track_size) if ext == 'flac' else synthetic_mp3(self.track_size)
+                self._audio[ext] = (data, hashlib.md5(data).hexdigest())
+            return self._audio[ext]
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = MockConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def base(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def _form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _api(self, name, handler, *args):
+        """接口通用处理：计数、模拟延迟与限流"""
+        self.config.count(name)
+        if self.config.latency:
+            time.sleep(self.config.latency)
+        if random.random() < self.config.error_rate:
+            return self._send(200, {'code': -460, 'message': 'Cheating'})
+        return self._send(200, handler(*args))
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        path = parsed.path
+        if path.startswith('/163cn.tv/'):
+            # 短链接的最后一段即歌曲 ID
+            self.config.count('short_link')
+            song_id = path.rsplit('/', 1)[-1]
+            return self._send(302, b'', headers={'Location': f"https://music.163.com/song?id={song_id}"})
+        if match := re.fullmatch(r'/api/album/(\d+)', path):
+            return self._api('album', self._album, int(match.group(1)))
+        if path == '/api/song/enhance/player/url':
+            return self._api('web_url', self._urls, [query.get('id')], 'lossless')
+        if path == '/api/nuser/account/get':
+            logged_in = 'MUSIC_U' in (self.headers.get('Cookie') or '')
+            return self._send(200, {'code': 200, 'profile': {'nickname': 'mock'} if logged_in else None})
+        if path.startswith('/cover/'):
+            self.config.count('cover')
+            return self._send(200, COVER_BYTES, 'image/jpeg')
+        if match := re.fullmatch(r'/cdn/(\d+)\.(flac|mp3)', path):
+            return self._cdn(match.group(2))
+        self._send(404, {'code': 404})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        form = self._form()
+        if path == '/eapi/song/enhance/player/url/v1':
+            _, payload = signer.decrypt(form['params'])
+            return self._api('url_v1', self._urls, payload['ids'], payload['level'])
+        if path == '/api/v3/song/detail':
+            ids = [item['id'] for item in json.loads(form['c'])]
+            return self._api('detail', self._details, ids)
+        if path == '/api/song/lyric':
+            return self._api('lyric', self._lyric, form['id'])
+        if path == '/api/v6/playlist/detail':
+            return self._api('playlist', self._playlist, int(form['id']))
+        self._send(404, {'code': 404})
+
+    def _album(self, album_id):
+        songs = [{'id': album_id * 100 + i, 'name': f"Track {i}"} for i in range(1, TRACKS_PER_ALBUM + 1)]
+        return {'code': 200, 'album': {'id': album_id, 'name': f"Mock Album {album_id}", 'songs': songs}}
+
+    def _playlist(self, playlist_id):
+        """歌单 P 由专辑 P 到 P+PLAYLIST_ALBUMS-1 的全部歌曲组成"""
+        track_ids = [{'id': album_id * 100 + i} for album_id in range(playlist_id, playlist_id + PLAYLIST_ALBUMS)
+                     for i in range(1, TRACKS_PER_ALBUM + 1)]
+        return {'code': 200, 'playlist': {'id': playlist_id, 'trackIds': track_ids}}
+
+    def _urls(self, ids, level):
+        ext = 'mp3' if level in LOSSY_LEVELS else 'flac'
+        data, digest = self.config.audio(ext)
+        items = [{
+            'id': int(song_id), 'url': f"{self.base}/cdn/{song_id}.{ext}", 'br': 999000, 'size': len(data),
+            'md5': digest, 'code': 200, 'expi': 1200, 'type': ext, 'level': level, 'encodeType': ext,
+        } for song_id in ids]
+        return {'code': 200, 'data': items}
+
+    def _details(self, ids):
+        songs = [{
+            'id': int(song_id), 'name': f"Song {song_id}", 'ar': [{'name': 'Mock Artist'}],
+            'al': {'name': f"Mock Album {int(song_id) // 100}", 'picUrl': f"{self.base}/cover/{int(song_id) // 100}.jpg"},
+        } for song_id in ids]
+        return {'code': 200, 'songs': songs}
+
+    def _lyric(self, song_id):
+        lines = [(i * 5, f"line {i}", f"第 {i} 行") for i in range(40)]
+        lrc = '\n'.join(f"[{t // 60:02d}:{t % 60:02d}.00]{text}" for t, text, _ in lines)
+        tlyric = '\n'.join(f"[{t // 60:02d}:{t % 60:02d}.00]{text}" for t, _, text in lines)
+        return {'code': 200, 'lrc': {'lyric': lrc}, 'tlyric': {'lyric': tlyric}}
+
+    def _cdn(self, ext):
+        self.config.count('cdn')
+        if self.config.latency:
+            time.sleep(self.config.latency)
+        if random.random() < self.config.error_rate:
+            return self._send(503, b'', 'text/plain', {'Retry-After': '0.1'})
+        data, _ = self.config.audio(ext)
+        start = 0
+        if match := re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range') or ''):
+            start = int(match.group(1))
+            if start >= len(data):
+                return self._send(416, b'', 'text/plain')
+        body = data[start:]
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Type', 'audio/flac' if ext == 'flac' else 'audio/mpeg')
+        self.send_header('Content-Length', str(len(body)))
+        if start:
+            self.send_header('Content-Range', f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.end_headers()
+        chunk = 64 * 1024
+        began = time.monotonic()
+        for offset in range(0, len(body), chunk):
+            self.wfile.write(body[offset:offset + chunk])
+            if self.config.bandwidth:
+                # 按带宽计算这一块应当写完的时间点
+                delay = (offset + chunk) / self.config.bandwidth - (time.monotonic() - began)
+                if delay > 0:
+                    time.sleep(delay)
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def start(host='127.0.0.1', port=0, **config):
+    """在后台线程启动替身服务，返回 (server, 基础地址)"""
+    handler = type('Handler', (MockHandler,), {'config': MockConfig(**config)})
+    server = MockServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='mock-server').start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="本地网易云接口替身")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址")
+    parser.add_argument('--port', type=int, default=8163, help="监听端口，默认 8163")
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求附加的延迟（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回限流响应的比例（0-1）")
+    parser.add_argument('--bandwidth', type=float, default=0.0, help="每个 CDN 连接的带宽（MB/s），0 表示不限")
+    parser.add_argument('--track-size', type=int, default=4, help="合成音频大小（MB），默认 4")
+    args = parser.parse_args()
+    server, base = start(args.host, args.port, latency=args.latency, error_rate=args.error_rate,
+                         bandwidth=args.bandwidth * 1024 * 1024, track_size=args.track_size * 1024 * 1024)
+    print(f"替身服务已启动: {base}")
+    print(f"使用方式: NETEASE_API_BASE={base} NETEASE_WEB_BASE={base} python core.py --mode api")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""进程内 LRU 缓存，以及可选的 SQLite 持久层"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+_MISSING = object()
+
+class LRUCache:
+    """线程安全的 LRU 缓存，超出容量时淘汰最久未使用的条目，可选 TTL（秒）"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            expires, value = item
+            if expires is not None and expires <= time.time():
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expired': self.expired,
+            }
+
+class SqliteStore:
+    """SQLite 持久层，按命名空间存放 JSON 值，进程重启后仍可命中
+
+    使用 WAL 与 synchronous=NORMAL：读写互不阻塞，提交时不再每次 fsync，serve 的多个工作进程可共用同一文件。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT, key TEXT, value TEXT, expires REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return json.loads(row[0])
+
+    def set(self, namespace, key, value, ttl=None):
+        self.set_many(namespace, [(key, value)], ttl)
+
+    def set_many(self, namespace, items, ttl=None):
+        """在一个事务中写入多条 (key, value)"""
+        expires = time.time() + ttl if ttl else None
+        rows = [(namespace, key, json.dumps(value, ensure_ascii=False), expires) for key, value in items]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+class TieredCache:
+    """两级缓存：先查进程内 LRU，未命中再查 SQLite 并回填；SQLite 出错只记录日志，不影响调用方"""
+
+    def __init__(self, namespace, maxsize=1024, ttl=None, store=None):
+        self.namespace = namespace
+        self.lru = LRUCache(maxsize, ttl)
+        self.store = store
+        self.store_hits = 0
+        self.store_misses = 0
+        self.store_errors = 0
+
+    def _store_error(self, e):
+        self.store_errors += 1
+        logging.warning(f"{self.namespace} 缓存持久层出错: {str(e)}")
+
+    def get(self, key, default=None):
+        key = str(key)
+        value = self.lru.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.store is None:
+            return default
+        try:
+            value = self.store.get(self.namespace, key, _MISSING)
+        except sqlite3.Error as e:
+            self._store_error(e)
+            return default
+        if value is _MISSING:
+            self.store_misses += 1
+            return default
+        self.store_hits += 1
+        self.lru.set(key, value)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.set_many([(key, value)], ttl)
+
+    def set_many(self, items, ttl=None):
+        """写入多条 (key, value)，持久层在一个事务中提交"""
+        items = [(str(key), value) for key, value in items]
+        for key, value in items:
+            self.lru.set(key, value, ttl)
+        if self.store is not None:
+            try:
+                self.store.set_many(self.namespace, items, ttl or self.lru.ttl)
+            except sqlite3.Error as e:
+                self._store_error(e)
+
+    def stats(self):
+        stats = self.lru.stats()
+        if self.store is not None:
+            stats.update(store_hits=self.store_hits, store_misses=self.store_misses, store_errors=self.store_errors)
+        return stats
+
+class SingleFlight:
+    """合并同一 key 的并发调用：只有第一个调用真正执行，其余调用等待并共享结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._calls), 'calls': self.calls, 'shared': self.shared}
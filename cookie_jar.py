@@ -0,0 +1,163 @@
+"""登录凭据：优先复用 cookie.txt，校验失效后才启动浏览器登录，并写回 cookie.txt"""
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+# 凭据文件与接口地址可用环境变量替换，基准测试时不会改动真实的 cookie.txt
+COOKIE_FILE = Path(os.environ.get('NETEASE_COOKIE_FILE') or Path(__file__).resolve().with_name('cookie.txt'))
+
+# 账号信息接口，带有效登录 Cookie 时返回 profile
+ACCOUNT_URL = os.environ.get('NETEASE_WEB_BASE', 'https://music.163.com') + "/api/nuser/account/get"
+
+def parse_cookie(text: str):
+    cookie_ = [item.strip().split('=', 1) for item in text.strip().split(';') if item.strip()]
+    cookie_ = {k.strip(): v.strip() for k, v in cookie_}
+    return cookie_
+
+def format_cookie(cookies):
+    return "; ".join(f"{k}={v}" for k, v in cookies.items())
+
+def load_cookie(path=COOKIE_FILE):
+    """读取 Cookie 文件，文件不存在时返回空字典"""
+    try:
+        with open(path, 'r') as f:
+            return parse_cookie(f.read())
+    except FileNotFoundError:
+        return {}
+
+def save_cookie(cookies, path=COOKIE_FILE):
+    """原子写回 Cookie 文件，core.py 与下载器共用同一份凭据"""
+    tmp_path = Path(path).with_name(Path(path).name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(format_cookie(cookies))
+    os.replace(tmp_path, path)
+
+class CookieStore:
+    """缓存解析后的 Cookie，文件的 mtime/inode/大小变化时才重新读取，多线程共享安全
+
+    check_interval 秒内不重复 stat，请求路径上通常只是一次时间比较；
+    返回的字典由多个线程共享，调用方不要修改。
+    """
+
+    def __init__(self, path=COOKIE_FILE, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._cookies = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval and self._signature is not None:
+            return self._cookies
+        with self._lock:
+            if now - self._checked_at >= self.check_interval or self._signature is None:
+                signature = self._stat_signature()
+                if signature != self._signature:
+                    self._cookies = load_cookie(self.path)
+                    self._signature = signature
+                    self.reloads += 1
+                self._checked_at = now
+            return self._cookies
+
+    def set(self, cookies):
+        """热替换 Cookie：写回文件并立即生效，无需重启服务"""
+        with self._lock:
+            save_cookie(cookies, self.path)
+            self._cookies = dict(cookies)
+            self._signature = self._stat_signature()
+            self._checked_at = time.monotonic()
+
+def check_cookie(session, cookies):
+    """用一次账号接口请求判断 Cookie 是否仍然有效
+
+    返回 True/False；网络错误等无法判断的情况返回 None，调用方不应据此认定 Cookie 失效。
+    """
+    if not cookies.get('MUSIC_U'):
+        return False
+    try:
+        response = session.get(ACCOUNT_URL, cookies=cookies, timeout=10)
+        if response.status_code != 200:
+            return False
+        data = response.json()
+    except Exception as e:
+        logging.warning(f"Cookie 校验失败: {str(e)}")
+        return None
+    return data.get('code') == 200 and bool(data.get('profile'))
+
+def browser_login(user_agent):
+    """启动一个浏览器获取 Cookie；selenium 只在这里按需导入"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.support.ui import WebDriverWait
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    options = Options()
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--headless")  # 无头模式
+    options.add_argument(f"user-agent={user_agent}")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+
+    # 使用webdriver-manager自动管理驱动
+    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    try:
+        driver.get("https://music.163.com")
+
+        # 等待页面加载
+        WebDriverWait(driver, 10).until(lambda d: d.execute_script("return document.readyState") == "complete")
+
+        # 检查登录状态
+        if "发现音乐" not in driver.page_source:
+            manual_login(driver)
+
+        return {c['name']: c['value'] for c in driver.get_cookies()}
+    finally:
+        # 关闭浏览器
+        driver.quit()
+
+def manual_login(driver):
+    """处理需要手动登录的情况"""
+    logging.warning("需要手动登录！")
+    driver.execute_script("document.querySelector('.link').click()")
+    input("请手动完成登录后按回车继续...")
+    time.sleep(5)  # 等待登录完成
+
+class CookieProvider:
+    """按需提供有效 Cookie：先用已保存的凭据，失效时才走浏览器登录"""
+
+    def __init__(self, session, path=COOKIE_FILE):
+        self.session = session
+        self.path = path
+
+    def get(self, user_agent):
+        cookies = load_cookie(self.path)
+        valid = check_cookie(self.session, cookies)
+        if valid:
+            logging.info("复用已保存的 Cookie")
+            return cookies
+        if valid is None:
+            # 校验请求本身失败（超时、DNS 等），不能说明 Cookie 失效，继续使用并保留 cookie.txt
+            logging.warning("无法校验已保存的 Cookie，继续使用")
+            return cookies
+
+        logging.info("已保存的 Cookie 无效，启动浏览器登录")
+        cookies = browser_login(user_agent)
+        if not cookies.get('MUSIC_U'):
+            # 未完成登录时浏览器只返回匿名 Cookie，写回会覆盖 cookie.txt 且下次启动仍要打开浏览器
+            logging.warning("浏览器未返回登录 Cookie（缺少 MUSIC_U），不写回 cookie.txt")
+            return cookies
+        save_cookie(cookies, self.path)
+        logging.info("Cookie获取成功，已写回 cookie.txt")
+        return cookies
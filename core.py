@@ -1,35 +1,114 @@
 import argparse
-from flask import Flask, request, render_template, redirect, jsonify
+from flask import Flask, Response, request, render_template, redirect, jsonify, stream_with_context
 import json
 import os
-import urllib.parse
 from hashlib import md5
 from random import randrange
 import requests
-from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from cache import LRUCache, SingleFlight, SqliteStore, TieredCache
+from cookie_jar import CookieStore
+from eapi import signer
+import metrics
+from ratelimit import ThrottledError, is_throttled, limiter, retry_after
 
 def HexDigest(data):
-    return "".join([hex(d)[2:].zfill(2) for d in data])
+    return data.hex()
 
 def HashDigest(text):
     HASH = md5(text.encode("utf-8"))
     return HASH.digest()
 
 def HashHexDigest(text):
-    return HexDigest(HashDigest(text))
+    return md5(text.encode("utf-8")).hexdigest()
 
-def parse_cookie(text: str):
-    cookie_ = [item.strip().split('=', 1) for item in text.strip().split(';') if item]
-    cookie_ = {k.strip(): v.strip() for k, v in cookie_}
-    return cookie_
+# 上游地址可通过环境变量替换，便于接入本地测试服务（benchmarks/mock_server.py）
+API_BASE = os.environ.get('NETEASE_API_BASE', 'https://interface3.music.163.com')
+WEB_BASE = os.environ.get('NETEASE_WEB_BASE', 'https://music.163.com')
 
-def read_cookie():
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    cookie_file = os.path.join(script_dir, 'cookie.txt')
-    with open(cookie_file, 'r') as f:
-        cookie_contents = f.read()
-    return cookie_contents
+# 上游连接池大小，扇出线程池与之相同，并发请求不会超过可复用的连接数
+POOL_SIZE = 20
+
+# 被限流的请求最多重试次数
+THROTTLE_RETRIES = 3
+
+class HttpClient:
+    """共享的 keep-alive 连接池，所有上游请求复用同一个 Session"""
+
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=3.05, read_timeout=10):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        # Cookie 逐请求传入，不在共享 Session 中留存，避免线程间串用
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    def request(self, method, url, family=None, **kwargs):
+        """family 为接口类别时先经过限流器，被限流的响应在退避后重试，重试用尽时抛出 ThrottledError"""
+        kwargs.setdefault('timeout', self.timeout)
+        if family is None:
+            return self.session.request(method, url, **kwargs)
+        for attempt in range(THROTTLE_RETRIES + 1):
+            limiter.acquire(family)
+            response = self.session.request(method, url, **kwargs)
+            if not is_throttled(response, kwargs.get('stream', False)):
+                limiter.success(family)
+                return response
+            limiter.throttled(family, retry_after(response))
+        raise ThrottledError(f"{family} 接口重试 {THROTTLE_RETRIES} 次后仍被限流")
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        """连接复用统计：请求数、新建连接数、复用次数"""
+        pools = self.adapter.poolmanager.pools
+        requests_count = connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_count += pool.num_requests
+                connections += pool.num_connections
+        return {
+            'requests': requests_count,
+            'connections': connections,
+            'reused': requests_count - connections,
+        }
+
+client = HttpClient()
+
+def init_client(**kwargs):
+    """按参数重建共享连接池，扇出线程池按连接池大小一并重建"""
+    global client, executor
+    client = HttpClient(**kwargs)
+    previous, executor = executor, ThreadPoolExecutor(max_workers=client.pool_size)
+    previous.shutdown(wait=False)
+    return client
+
+# 歌曲详情与歌词基本不变，长期缓存；签名音频链接会过期，按 (id, level) 短期缓存
+URL_CACHE_TTL = 600
+detail_cache = TieredCache('detail', maxsize=10000)
+lyric_cache = TieredCache('lyric', maxsize=2000)
+url_cache = TieredCache('url', maxsize=5000, ttl=URL_CACHE_TTL)
+
+def init_cache(db_path=None):
+    """为详情与歌词缓存挂载 SQLite 持久层"""
+    store = SqliteStore(db_path) if db_path else None
+    detail_cache.store = store
+    lyric_cache.store = store
+
+def cache_stats():
+    return {'detail': detail_cache.stats(), 'lyric': lyric_cache.stats(), 'url': url_cache.stats()}
+
+# 请求路径上使用的 Cookie，文件变化时自动重新加载
+cookie_store = CookieStore()
 
 def post(url, params, cookie):
     headers = {
@@ -43,17 +122,59 @@ def post(url, params, cookie):
         "deviceId": "pyncm!"
     }
     cookies.update(cookie)
-    response = requests.post(url, headers=headers, cookies=cookies, data={"params": params})
+    response = client.post(url, family='url', headers=headers, cookies=cookies, data={"params": params})
     return response.text
 
+# 相同的并发请求只向上游解析一次
+song_flight = SingleFlight()
+link_flight = SingleFlight()
+
+# 分享短链接的跳转目标不会变化，缓存后不再请求
+SHORT_LINK_TIMEOUT = 5
+short_link_cache = LRUCache(maxsize=10000)
+
+def _fetch_location(link):
+    with metrics.timer(metrics.UPSTREAM_SECONDS, call='ids'):
+        response = client.get(link, allow_redirects=False, timeout=SHORT_LINK_TIMEOUT)
+    location = response.headers.get('Location')
+    if location:
+        short_link_cache.set(link, location)
+    return location
+
+def short_link_location(link):
+    """读取短链接跳转的目标地址"""
+    location = short_link_cache.get(link)
+    if location is None:
+        location = link_flight.do(link, _fetch_location, link)
+    return location
+
+def _location_or_none(link):
+    try:
+        return short_link_location(link)
+    except Exception:
+        return None
+
+def resolve_short_links(links):
+    """并发展开多个短链接，返回 {短链接: 跳转地址}，失败的为 None"""
+    links = [link for link in dict.fromkeys(links) if '163cn.tv' in link]
+    return dict(zip(links, executor.map(_location_or_none, links)))
+
+def song_id_from_url(url):
+    """从歌曲链接中取出歌曲ID，不是链接时原样返回"""
+    if 'music.163.com' in url:
+        index = url.find('id=') + 3
+        url = url[index:].split('&')[0]
+    return url
+
 def ids(ids):
     if '163cn.tv' in ids:
-        response = requests.get(ids, allow_redirects=False)
-        ids = response.headers.get('Location')
-    if 'music.163.com' in ids:
-        index = ids.find('id=') + 3
-        ids = ids[index:].split('&')[0]
-    return ids
+        ids = short_link_location(ids)
+    return song_id_from_url(ids)
+
+def ids_batch(items):
+    """批量解析歌曲ID，短链接并发展开；展开失败的保留原值"""
+    locations = resolve_short_links(items)
+    return [song_id_from_url(locations.get(item) or item) for item in items]
 
 def size(value):
     units = ["B", "KB", "MB", "GB", "TB", "PB"]
@@ -64,21 +185,29 @@ def size(value):
         value = value / size
     return value
 
+MUSIC_LEVELS = {
+    'standard': "标准音质",
+    'exhigh': "极高音质",
+    'lossless': "无损音质",
+    'hires': "Hires音质",
+    'sky': "沉浸环绕声",
+    'jyeffect': "高清环绕声",
+    'jymaster': "超清母带"
+}
+
+# /Song_V1 支持的 type 参数
+SONG_TYPES = ('text', 'down', 'json')
+
 def music_level1(value):
-    levels = {
-        'standard': "标准音质",
-        'exhigh': "极高音质",
-        'lossless': "无损音质",
-        'hires': "Hires音质",
-        'sky': "沉浸环绕声",
-        'jyeffect': "高清环绕声",
-        'jymaster': "超清母带"
-    }
-    return levels.get(value, "未知音质")
+    return MUSIC_LEVELS.get(value, "未知音质")
+
+def eapi_params(url, payload):
+    """按 eapi 规则加密请求参数"""
+    with metrics.timer(metrics.SIGN_SECONDS):
+        return signer.sign(url, payload)
 
 def url_v1(id, level, cookies):
-    url = "https://interface3.music.163.com/eapi/song/enhance/player/url/v1"
-    AES_KEY = b"e82ckenh8dichen8"
+    url = f"{API_BASE}/eapi/song/enhance/player/url/v1"
     config = {
         "os": "pc",
         "appver": "",
@@ -88,7 +217,7 @@ def url_v1(id, level, cookies):
     }
 
     payload = {
-        'ids': [id],
+        'ids': id if isinstance(id, list) else [id],
         'level': level,
         'encodeType': 'flac',
         'header': json.dumps(config),
@@ -96,31 +225,203 @@ def url_v1(id, level, cookies):
 
     if level == 'sky':
         payload['immerseType'] = 'c51'
-    
-    url2 = urllib.parse.urlparse(url).path.replace("/eapi/", "/api/")
-    digest = HashHexDigest(f"nobody{url2}use{json.dumps(payload)}md5forencrypt")
-    params = f"{url2}-36cd479b6b5-{json.dumps(payload)}-36cd479b6b5-{digest}"
-    padder = padding.PKCS7(algorithms.AES(AES_KEY).block_size).padder()
-    padded_data = padder.update(params.encode()) + padder.finalize()
-    cipher = Cipher(algorithms.AES(AES_KEY), modes.ECB())
-    encryptor = cipher.encryptor()
-    enc = encryptor.update(padded_data) + encryptor.finalize()
-    params = HexDigest(enc)
-    response = post(url, params, cookies)
+
+    params = eapi_params(url, payload)
+    with metrics.timer(metrics.UPSTREAM_SECONDS, call='url_v1'):
+        response = post(url, params, cookies)
     return json.loads(response)
 
+# 单次 eapi 请求最多携带的歌曲数
+URL_BATCH_SIZE = 50
+
+def url_v1_batch(song_ids, level, cookies, chunk_size=URL_BATCH_SIZE):
+    """批量获取歌曲链接，返回 {歌曲ID: data项}，获取失败的歌曲对应 None"""
+    song_ids = [str(song_id) for song_id in song_ids]
+    result = {}
+    for song_id in song_ids:
+        cached = url_cache.get(f"{song_id}:{level}")
+        if cached is not None:
+            result[song_id] = cached
+    pending = [song_id for song_id in dict.fromkeys(song_ids) if song_id not in result]
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        try:
+            entries = url_v1(chunk, level, cookies)['data']
+        except ThrottledError:
+            # 被限流时逐首重试只会放大请求量，整批按失败处理
+            entries = []
+        except Exception:
+            # 整批失败时逐首重试，避免一首歌拖垮整批
+            entries = []
+            for song_id in chunk:
+                try:
+                    entries.extend(url_v1(song_id, level, cookies)['data'])
+                except ThrottledError:
+                    break
+                except Exception:
+                    pass
+        for item in entries:
+            result[str(item['id'])] = item
+            if item.get('url'):
+                # 以接口给出的有效期为上限，避免缓存已过期的签名链接
+                url_cache.set(f"{item['id']}:{level}", item, min(URL_CACHE_TTL, item.get('expi') or URL_CACHE_TTL))
+    return {song_id: result.get(song_id) for song_id in song_ids}
+
 def name_v1(id):
-    urls = "https://interface3.music.163.com/api/v3/song/detail"
-    data = {'c': json.dumps([{"id":id,"v":0}])}
-    response = requests.post(url=urls, data=data)
+    urls = f"{API_BASE}/api/v3/song/detail"
+    data = {'c': json.dumps([{"id":i,"v":0} for i in (id if isinstance(id, list) else [id])])}
+    with metrics.timer(metrics.UPSTREAM_SECONDS, call='name_v1'):
+        response = client.post(urls, family='detail', data=data)
     return response.json()
 
+# 单次 song/detail 请求最多携带的歌曲数
+DETAIL_BATCH_SIZE = 500
+
+def song_detail(song):
+    """从 song/detail 的歌曲项中提取常用元数据"""
+    return {
+        'name': song['name'],
+        'artists': [ar['name'] for ar in song['ar']],
+        'album': song['al']['name'],
+        'picUrl': song['al']['picUrl'],
+    }
+
+def name_v1_batch(song_ids, chunk_size=DETAIL_BATCH_SIZE):
+    """批量获取歌曲详情，返回 {歌曲ID: {name, artists, album, picUrl}}，获取失败的歌曲对应 None"""
+    song_ids = [str(song_id) for song_id in song_ids]
+    result = {}
+    for song_id in song_ids:
+        cached = detail_cache.get(song_id)
+        if cached is not None:
+            result[song_id] = cached
+    pending = [song_id for song_id in dict.fromkeys(song_ids) if song_id not in result]
+    for start in range(0, len(pending), chunk_size):
+        try:
+            songs = name_v1(pending[start:start + chunk_size])['songs']
+        except Exception:
+            continue
+        details = {str(song['id']): song_detail(song) for song in songs}
+        result.update(details)
+        # 每批详情在一个事务中写入持久层
+        detail_cache.set_many(details.items())
+    return {song_id: result.get(song_id) for song_id in song_ids}
+
 def lyric_v1(id, cookies):
-    url = "https://interface3.music.163.com/api/song/lyric"
+    cached = lyric_cache.get(id)
+    if cached is not None:
+        return cached
+    url = f"{API_BASE}/api/song/lyric"
     data = {'id': id, 'cp': 'false', 'tv': '0', 'lv': '0', 'rv': '0', 'kv': '0', 'yv': '0', 'ytv': '0', 'yrv': '0'}
-    response = requests.post(url=url, data=data, cookies=cookies)
+    with metrics.timer(metrics.UPSTREAM_SECONDS, call='lyric_v1'):
+        response = client.post(url, family='lyric', data=data, cookies=cookies)
+    lyricv1 = response.json()
+    if 'lrc' in lyricv1:
+        lyric_cache.set(id, lyricv1)
+    return lyricv1
+
+# 链接、详情、歌词三类上游请求互不依赖，共用线程池并发执行
+executor = ThreadPoolExecutor(max_workers=POOL_SIZE)
+
+def _lyric_or_none(song_id, cookies):
+    try:
+        return lyric_v1(song_id, cookies)
+    except Exception:
+        return None
+
+def resolve_song(song_id, level, cookies, with_lyric=True):
+    """并发获取单曲的链接、详情与歌词，返回 (url_v1 数据项, 详情, 歌词)"""
+    song_id = str(song_id)
+    url_future = executor.submit(url_v1_batch, [song_id], level, cookies)
+    detail_future = executor.submit(name_v1_batch, [song_id])
+    lyric_future = executor.submit(lyric_v1, song_id, cookies) if with_lyric else None
+    urlv1 = url_future.result()[song_id]
+    detail = detail_future.result()[song_id]
+    lyricv1 = lyric_future.result() if lyric_future else None
+    return urlv1, detail, lyricv1
+
+def resolve_songs(song_ids, level, cookies, with_lyric=True):
+    """并发批量解析多首歌曲，返回 {歌曲ID: (url_v1 数据项, 详情, 歌词)}，失败项为 None"""
+    song_ids = [str(song_id) for song_id in song_ids]
+    url_future = executor.submit(url_v1_batch, song_ids, level, cookies)
+    detail_future = executor.submit(name_v1_batch, song_ids)
+    lyric_futures = {song_id: executor.submit(_lyric_or_none, song_id, cookies) for song_id in song_ids} if with_lyric else {}
+    urlv1s = url_future.result()
+    details = detail_future.result()
+    lyrics = {song_id: future.result() for song_id, future in lyric_futures.items()}
+    return {song_id: (urlv1s[song_id], details[song_id], lyrics.get(song_id)) for song_id in song_ids}
+
+def song_json(urlv1, detail, lyricv1):
+    """组装 type=json 格式的单曲数据"""
+    return {
+        "status": 200,
+        "name": detail['name'],
+        "pic": detail['picUrl'],
+        "ar_name": '/'.join(detail['artists']),
+        "al_name": detail['album'],
+        "level": music_level1(urlv1['level']),
+        "size": size(urlv1['size']),
+        "url": urlv1['url'].replace("http://", "https://", 1),
+        "lyric": lyricv1['lrc']['lyric'],
+        "tlyric": lyricv1.get('tlyric', {}).get('lyric', None)
+    }
+
+def Song_v1_batch(song_ids, level, cookies):
+    """批量解析逗号分隔的多个歌曲ID，单曲失败不影响其余歌曲"""
+    id_list = ids_batch([item.strip() for item in song_ids.split(',') if item.strip()])
+    resolved = resolve_songs(id_list, level, cookies)
+    songs = [song_record(song_id, *resolved[str(song_id)]) for song_id in id_list]
+    return jsonify({"status": 200, "data": songs})
+
+def song_record(song_id, urlv1, detail, lyricv1):
+    """批量与流式接口中的单曲记录，失败时返回 status 400 的条目"""
+    try:
+        if urlv1 is None or urlv1['url'] is None or detail is None or lyricv1 is None:
+            raise ValueError('信息获取不完整！')
+        return dict(song_json(urlv1, detail, lyricv1), id=song_id)
+    except Exception as e:
+        return {"status": 400, "id": song_id, 'msg': str(e)}
+
+def album_v1(album_id):
+    """专辑详情，返回接口原始 JSON（含 album.songs）"""
+    url = f"{WEB_BASE}/api/album/{album_id}"
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+        "Referer": "https://music.163.com/"
+    }
+    with metrics.timer(metrics.UPSTREAM_SECONDS, call='album_v1'):
+        response = client.get(url, family='album', headers=headers)
+    response.raise_for_status()
     return response.json()
 
+def playlist_v1(playlist_id, cookies):
+    """歌单详情，返回接口原始 JSON（含 playlist.trackIds，即全部曲目 ID）"""
+    url = f"{API_BASE}/api/v6/playlist/detail"
+    data = {'id': playlist_id, 'n': 100000, 's': 8}
+    with metrics.timer(metrics.UPSTREAM_SECONDS, call='playlist_v1'):
+        response = client.post(url, family='playlist', data=data, cookies=cookies)
+    response.raise_for_status()
+    return response.json()
+
+def album_song_ids(album_id):
+    return [str(song['id']) for song in album_v1(album_id)['album']['songs']]
+
+def playlist_song_ids(playlist_id, cookies):
+    return [str(track['id']) for track in playlist_v1(playlist_id, cookies)['playlist']['trackIds']]
+
+# 流式接口首批只解析少量歌曲，让客户端尽快收到第一条；之后按 STREAM_BATCH_SIZE 分批，内存只保留一批
+STREAM_FIRST_BATCH = 10
+STREAM_BATCH_SIZE = 50
+
+def stream_songs(song_ids, level, cookies, batch_size=STREAM_BATCH_SIZE):
+    """分批解析并逐条产出 NDJSON 行"""
+    start, size_ = 0, min(STREAM_FIRST_BATCH, batch_size)
+    while start < len(song_ids):
+        chunk = song_ids[start:start + size_]
+        resolved = resolve_songs(chunk, level, cookies)
+        for song_id in chunk:
+            yield json.dumps(song_record(song_id, *resolved[song_id]), ensure_ascii=False) + '\n'
+        start, size_ = start + size_, batch_size
+
 # Flask 应用部分
 app = Flask(__name__)
 
@@ -128,7 +429,99 @@ app = Flask(__name__)
 def index():
     return render_template('index.html')
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        'http': client.stats(),
+        'cache': _cache_stats(),
+        'singleflight': _flight_stats(),
+        'cookie_reloads': cookie_store.reloads,
+        'ratelimit': limiter.stats(),
+    })
+
+def _cache_stats():
+    return dict(cache_stats(), short_link=short_link_cache.stats())
+
+def _flight_stats():
+    return {'song': song_flight.stats(), 'link': link_flight.stats()}
+
+# 由各组件的统计字典派生的指标，serve 多进程时与其他指标一样跨进程合计
+CACHE_HITS = metrics.Collected('netease_cache_hits_total', "缓存命中次数", 'counter', 'cache',
+                               lambda: {name: stat['hits'] for name, stat in _cache_stats().items()})
+CACHE_MISSES = metrics.Collected('netease_cache_misses_total', "缓存未命中次数", 'counter', 'cache',
+                                 lambda: {name: stat['misses'] for name, stat in _cache_stats().items()})
+FLIGHT_IN_FLIGHT = metrics.Collected('netease_singleflight_in_flight', "正在进行的合并请求数", 'gauge', 'flight',
+                                     lambda: {name: stat['in_flight'] for name, stat in _flight_stats().items()})
+FLIGHT_SHARED = metrics.Collected('netease_singleflight_shared_total', "复用进行中结果的请求数", 'counter', 'flight',
+                                  lambda: {name: stat['shared'] for name, stat in _flight_stats().items()})
+HTTP_TOTAL = metrics.Collected('netease_http_total', "上游连接池请求与连接数", 'counter', 'kind',
+                               lambda: {kind: count for kind, count in client.stats().items() if kind in ('requests', 'connections')})
+
+def _stats_lines():
+    """不能按进程求和的指标：命中率由合计后的命中与未命中次数计算，限流速率取本进程（共享 NETEASE_RATE_DB 时各进程一致）"""
+    hits, misses = CACHE_HITS.merged(), CACHE_MISSES.merged()
+    ratios = {key[0]: hits[key] / max(hits[key] + misses.get(key, 0), 1) for key in hits}
+    lines = metrics.sample_lines('netease_cache_hit_ratio', "缓存命中率", 'gauge', ratios, 'cache')
+    lines += metrics.sample_lines('netease_ratelimit_rate', "各接口类别当前允许的每秒请求数", 'gauge',
+                                  limiter.stats()['rates'], 'family')
+    return lines
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(_stats_lines()), mimetype='text/plain; version=0.0.4')
+
+# 采样分析器默认关闭，设置 NETEASE_PROFILING=1 后才开放控制接口
+PROFILING_ENABLED = os.environ.get('NETEASE_PROFILING') == '1'
+
+@app.route('/debug/profile', methods=['POST'])
+def debug_profile():
+    """action=start 开始采样，action=stop 停止并返回折叠栈"""
+    if not PROFILING_ENABLED:
+        return jsonify({'error': '未开启采样分析'}), 404
+    if request.args.get('action') == 'start':
+        started = metrics.profiler.start(float(request.args.get('interval', 0.005)))
+        return jsonify({'running': True, 'started': started})
+    return Response(metrics.profiler.stop(), mimetype='text/plain')
+
+def _stream_collection(kind):
+    """专辑/歌单流式接口：展开一次曲目列表，分批解析并以 NDJSON 逐条返回"""
+    collection = request.values.get('id') or request.values.get('url')
+    level = request.values.get('level')
+    if not collection:
+        return jsonify({'error': '必须提供 id 或 url 参数'}), 400
+    if level is None:
+        return jsonify({'error': 'level参数为空'}), 400
+
+    cookies = cookie_store.get()
+    collection_id = ids(collection)
+    try:
+        song_ids = album_song_ids(collection_id) if kind == 'album' else playlist_song_ids(collection_id, cookies)
+    except Exception as e:
+        return jsonify({"status": 400, 'msg': f'展开{"专辑" if kind == "album" else "歌单"}失败：{str(e)}'}), 400
+    endpoint = 'Album_V1' if kind == 'album' else 'Playlist_V1'
+    metrics.COLLECTION_REQUESTS.inc(endpoint=endpoint, level=metrics.bounded_label(level, MUSIC_LEVELS))
+
+    def generate():
+        # 响应体在视图返回后才生成，正在处理的计数放在生成器内
+        metrics.IN_FLIGHT.inc(endpoint=endpoint)
+        try:
+            yield from stream_songs(song_ids, level, cookies)
+        finally:
+            metrics.IN_FLIGHT.dec(endpoint=endpoint)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Track-Count': str(len(song_ids))})
+
+@app.route('/Album_V1', methods=['GET', 'POST'])
+def Album_v1():
+    return _stream_collection('album')
+
+@app.route('/Playlist_V1', methods=['GET', 'POST'])
+def Playlist_v1():
+    return _stream_collection('playlist')
+
 @app.route('/Song_V1', methods=['GET', 'POST'])
+@metrics.IN_FLIGHT.track(endpoint='Song_V1')
 def Song_v1():
     if request.method == 'GET':
         song_ids = request.args.get('ids')
@@ -147,68 +540,53 @@ def Song_v1():
         return jsonify({'error': 'level参数为空'}), 400
     if type_ is None:
         return jsonify({'error': 'type参数为空'}), 400
+    metrics.SONG_REQUESTS.inc(level=metrics.bounded_label(level, MUSIC_LEVELS), type=metrics.bounded_label(type_, SONG_TYPES))
+
+    if song_ids and ',' in song_ids:
+        if type_ != 'json':
+            return jsonify({"status": 400, 'msg': '批量解析仅支持 json 类型！'}), 400
+        return Song_v1_batch(song_ids, level, cookie_store.get())
 
     jsondata = song_ids if song_ids else url
-    cookies = parse_cookie(read_cookie())
-    urlv1 = url_v1(ids(jsondata),level,cookies)
-    namev1 = name_v1(urlv1['data'][0]['id'])
-    lyricv1 = lyric_v1(urlv1['data'][0]['id'],cookies)
-    if urlv1['data'][0]['url'] is not None:
-        if namev1['songs']:
-           song_url = urlv1['data'][0]['url']
-           song_name = namev1['songs'][0]['name']
-           song_picUrl = namev1['songs'][0]['al']['picUrl']
-           song_alname = namev1['songs'][0]['al']['name']
-           artist_names = []
-           for song in namev1['songs']:
-               ar_list = song['ar']
-               if len(ar_list) > 0:
-                   artist_names.append('/'.join(ar['name'] for ar in ar_list))
-               song_arname = ', '.join(artist_names)
+    cookies = cookie_store.get()
+    # down 类型直接重定向到音频，无需歌词
+    song_id = ids(jsondata)
+    urlv1, detail, lyricv1 = song_flight.do(
+        (song_id, level, type_), resolve_song, song_id, level, cookies, with_lyric=type_ != 'down'
+    )
+    if urlv1 is not None and urlv1['url'] is not None:
+        if detail:
+           song_url = urlv1['url']
+           song_name = detail['name']
+           song_picUrl = detail['picUrl']
+           song_alname = detail['album']
+           song_arname = '/'.join(detail['artists'])
     else:
-       data = jsonify({"status": 400,'msg': '信息获取不完整！'}), 400
+       return jsonify({"status": 400,'msg': '信息获取不完整！'}), 400
     if type_ == 'text':
-       data = '歌曲名称：' + song_name + '<br>歌曲图片：' + song_picUrl  + '<br>歌手：' + song_arname + '<br>歌曲专辑：' + song_alname + '<br>歌曲音质：' + music_level1(urlv1['data'][0]['level']) + '<br>歌曲大小：' + size(urlv1['data'][0]['size']) + '<br>音乐地址：' + song_url
+       data = '歌曲名称：' + song_name + '<br>歌曲图片：' + song_picUrl  + '<br>歌手：' + song_arname + '<br>歌曲专辑：' + song_alname + '<br>歌曲音质：' + music_level1(urlv1['level']) + '<br>歌曲大小：' + size(urlv1['size']) + '<br>音乐地址：' + song_url
     elif  type_ == 'down':
        data = redirect(song_url)
     elif  type_ == 'json':
-       data = {
-           "status": 200,
-           "name": song_name,
-           "pic": song_picUrl,
-           "ar_name": song_arname,
-           "al_name": song_alname,
-           "level":music_level1(urlv1['data'][0]['level']),
-           "size": size(urlv1['data'][0]['size']),
-           "url": song_url.replace("http://", "https://", 1),
-           "lyric": lyricv1['lrc']['lyric'],
-           "tlyric": lyricv1.get('tlyric', {}).get('lyric', None)
-        }
-       data = jsonify(data)
+       data = jsonify(song_json(urlv1, detail, lyricv1))
     else:
         data = jsonify({"status": 400,'msg': '解析失败！请检查参数是否完整！'}), 400
     return data
 
-def start_gui(url=None, level='lossless'):
-    if url:
-        print(f"正在处理 URL: {url}，音质：{level}")
-        song_ids = ids(url)
-        cookies = parse_cookie(read_cookie())
-        urlv1 = url_v1(song_ids, level, cookies)
-        namev1 = name_v1(urlv1['data'][0]['id'])
-        lyricv1 = lyric_v1(urlv1['data'][0]['id'], cookies)
-
-        song_name = namev1['songs'][0]['name']
-        song_pic = namev1['songs'][0]['al']['picUrl']
-        artist_names = ', '.join(artist['name'] for artist in namev1['songs'][0]['ar'])
-        album_name = namev1['songs'][0]['al']['name']
-        music_quality = music_level1(urlv1['data'][0]['level'])
-        file_size = size(urlv1['data'][0]['size'])
-        music_url = urlv1['data'][0]['url']
-        lyrics = lyricv1['lrc']['lyric']
-        translated_lyrics = lyricv1.get('tlyric', {}).get('lyric', None)
-
-        output_text = f"""
+def song_text(song_id, urlv1, detail, lyricv1):
+    """生成 GUI 模式下单曲的文本输出"""
+    song_name = detail['name']
+    song_pic = detail['picUrl']
+    artist_names = ', '.join(detail['artists'])
+    album_name = detail['album']
+    music_quality = music_level1(urlv1['level'])
+    file_size = size(urlv1['size'])
+    music_url = urlv1['url']
+    lyrics = lyricv1['lrc']['lyric']
+    translated_lyrics = lyricv1.get('tlyric', {}).get('lyric', None)
+
+    return f"""
+        歌曲ID: {song_id}
         歌曲名称: {song_name}
         歌曲图片: {song_pic}
         歌手: {artist_names}
@@ -220,7 +598,20 @@ def start_gui(url=None, level='lossless'):
         翻译歌词: {translated_lyrics if translated_lyrics else '没有翻译歌词'}
         """
 
-        print(output_text)
+def start_gui(url=None, level='lossless'):
+    if url:
+        print(f"正在处理 URL: {url}，音质：{level}")
+        # 支持逗号分隔的多个链接，链接与详情按批获取
+        song_ids = ids_batch([item.strip() for item in url.split(',') if item.strip()])
+        cookies = cookie_store.get()
+        resolved = resolve_songs(song_ids, level, cookies)
+
+        for song_id in song_ids:
+            urlv1, detail, lyricv1 = resolved[str(song_id)]
+            if urlv1 is None or detail is None or lyricv1 is None:
+                print(f"\n        歌曲ID: {song_id}\n        信息获取不完整\n")
+                continue
+            print(song_text(song_id, urlv1, detail, lyricv1))
     else:
         print("没有提供 URL 参数")
 
@@ -230,11 +621,35 @@ def start_api():
 # 启动模式解析
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="启动 API 或 GUI")
-    parser.add_argument('--mode', choices=['api', 'gui'], help="选择启动模式：api 或 gui")
+    parser.add_argument('--mode', choices=['api', 'gui', 'serve'], help="选择启动模式：api、gui 或 serve（多进程生产服务）")
     parser.add_argument('--url', help="提供 URL 参数供 GUI 模式使用")
     parser.add_argument('--level', default='lossless', choices=['standard', 'exhigh', 'lossless', 'hires', 'sky', 'jyeffect', 'jymaster'], help="选择音质等级，默认是 lossless")
+    parser.add_argument('--pool-size', type=int, default=20, help="上游连接池与扇出线程池大小，默认 20")
+    parser.add_argument('--connect-timeout', type=float, default=3.05, help="上游连接超时（秒）")
+    parser.add_argument('--read-timeout', type=float, default=10, help="上游读取超时（秒）")
+    parser.add_argument('--cache-db', help="详情与歌词缓存的 SQLite 文件路径，不指定则只使用内存缓存")
+    parser.add_argument('--host', default='0.0.0.0', help="serve 模式监听地址")
+    parser.add_argument('--port', type=int, default=5000, help="serve 模式监听端口")
+    parser.add_argument('--workers', type=int, default=2, help="serve 模式工作进程数，默认 2")
+    parser.add_argument('--threads', type=int, default=16, help="serve 模式每个进程的处理线程数，默认 16")
+    parser.add_argument('--backlog', type=int, default=128, help="serve 模式监听队列长度，默认 128")
+    parser.add_argument('--graceful-timeout', type=float, default=30, help="serve 模式退出时等待处理中请求的秒数")
     args = parser.parse_args()
+    # 多个工作进程的指标写入同一目录，/metrics 由任一进程响应都输出合计
+    metrics_dir = metrics.prepare_shared() if args.mode == 'serve' and args.workers > 1 else None
 
+    def init_process():
+        # 连接池与 SQLite 连接不能跨 fork 共享，serve 模式下在每个工作进程内各自创建一次
+        init_cache(args.cache_db)
+        init_client(pool_size=args.pool_size, connect_timeout=args.connect_timeout, read_timeout=args.read_timeout)
+        if metrics_dir:
+            metrics.share(metrics_dir)
+
+    if args.mode == 'serve':
+        from serve import serve
+        serve(app, args.host, args.port, args.workers, args.threads, args.backlog, args.graceful_timeout, init_process)
+    else:
+        init_process()
     if args.mode == 'api':
         start_api()
     elif args.mode == 'gui':
@@ -0,0 +1,92 @@
+"""专辑封面缓存：按 picUrl 与缩放参数的哈希存放在 covers 目录，同一封面只下载一次"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from pathlib import Path
+
+from cache import LRUCache
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 为可选依赖，缺失时不缩放封面
+    Image = None
+
+def cover_mime(data):
+    return 'image/png' if data.startswith(b'\x89PNG') else 'image/jpeg'
+
+def cover_ext(data):
+    return '.png' if cover_mime(data) == 'image/png' else '.jpg'
+
+class CoverCache:
+    """内容寻址的封面缓存，磁盘一份、内存中保留最近使用的若干份"""
+
+    def __init__(self, session, cache_dir='covers', max_size=0, quality=90, memory_items=32):
+        self.session = session
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+        self.max_size = max_size
+        self.quality = quality
+        self._memory = LRUCache(memory_items)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        if max_size and Image is None:
+            logging.warning("未安装 Pillow，封面将保持原始尺寸")
+
+    def _key_lock(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, url):
+        """返回封面字节，失败时返回 None"""
+        if not url:
+            return None
+        # 缓存的是缩放后的字节，缩放参数不同的运行不能共用同一份
+        key = hashlib.sha1(f"{url}|{self.max_size}|{self.quality}".encode('utf-8')).hexdigest()
+        data = self._memory.get(key)
+        if data is not None:
+            return data
+        # 同一封面并发请求时只下载一次
+        with self._key_lock(key):
+            data = self._memory.get(key)
+            if data is not None:
+                return data
+            path = self.cache_dir / key
+            if path.exists():
+                data = path.read_bytes()
+            else:
+                data = self._fetch(url)
+                if data is None:
+                    return None
+                tmp_path = path.with_name(key + '.tmp')
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+            self._memory.set(key, data)
+            return data
+
+    def _fetch(self, url):
+        try:
+            response = self.session.get(url, timeout=30)
+            response.raise_for_status()
+            data = response.content
+        except Exception as e:
+            logging.warning(f"封面下载失败: {str(e)}")
+            return None
+        return self._resize(data)
+
+    def _resize(self, data):
+        """按需把封面缩放到 max_size 以内并重新压缩为 JPEG"""
+        if not self.max_size or Image is None:
+            return data
+        try:
+            image = Image.open(io.BytesIO(data))
+            if max(image.size) <= self.max_size and image.format == 'JPEG':
+                return data
+            image.thumbnail((self.max_size, self.max_size))
+            output = io.BytesIO()
+            image.convert('RGB').save(output, format='JPEG', quality=self.quality, optimize=True)
+            return output.getvalue()
+        except Exception as e:
+            logging.warning(f"封面缩放失败，使用原图: {str(e)}")
+            return data
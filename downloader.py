@@ -1,18 +1,26 @@
+import argparse
+import hashlib
 import os
 import re
 import time
 import json
 import random
+import shutil
+import threading
 import requests
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 from mutagen.flac import FLAC, Picture
 from mutagen.id3 import ID3, APIC, TIT2, TALB, TPE1, TRCK
 from mutagen.id3._util import ID3NoHeaderError
+from cookie_jar import CookieProvider
+from covers import CoverCache, cover_ext, cover_mime
+from manifest import iter_records, unique_records, write_records
+import metrics
+from ratelimit import backoff_delay, is_throttled, limiter, retry_after
 
 # 日志配置
 logging.basicConfig(
@@ -24,22 +32,86 @@ logging.basicConfig(
     ]
 )
 
+# 网页端接口地址，可用环境变量指向本地测试服务
+WEB_BASE = os.environ.get('NETEASE_WEB_BASE', 'https://music.163.com')
+
+# 标签区预留的填充空间，之后修改标签可原地写入而不必重写整个文件
+TAG_PADDING = 256 * 1024
+# 剩余填充不足该值时重新预留 TAG_PADDING，保证下次修改标签仍可原地写入
+MIN_PADDING = 16 * 1024
+
+def _tag_padding(info):
+    """剩余填充不少于 MIN_PADDING 时原地写入，否则重新预留 TAG_PADDING"""
+    return info.padding if info.padding >= MIN_PADDING else TAG_PADDING
+
+def write_tags(file_path, metadata, cover_data):
+    """写入元数据，返回耗时（秒）；定义在模块级以便交给子进程执行"""
+    start_time = time.monotonic()
+    try:
+        if file_path.suffix.lower() == '.flac':
+            audio = FLAC(file_path)
+            audio.update({
+                'title': metadata['title'],
+                'artist': metadata['artist'],
+                'album': metadata['album'],
+                'tracknumber': str(metadata['track_num'])
+            })
+            if cover_data:
+                image = Picture()
+                image.type = 3
+                image.mime = cover_mime(cover_data)
+                image.data = cover_data
+                audio.add_picture(image)
+            audio.save(padding=_tag_padding)
+        else:
+            try:
+                audio = ID3(file_path)
+            except ID3NoHeaderError:
+                audio = ID3()
+            audio.add(TIT2(encoding=3, text=metadata['title']))
+            audio.add(TPE1(encoding=3, text=metadata['artist']))
+            audio.add(TALB(encoding=3, text=metadata['album']))
+            audio.add(TRCK(encoding=3, text=str(metadata['track_num'])))
+            if cover_data:
+                audio.add(APIC(
+                    encoding=0,
+                    mime=cover_mime(cover_data),
+                    type=3,
+                    desc='Cover',
+                    data=cover_data
+                ))
+            audio.save(file_path, padding=_tag_padding)
+    except Exception as e:
+        logging.error(f"元数据写入失败: {str(e)}")
+    return time.monotonic() - start_time
+
 class NeteaseDownloader:
-    def __init__(self):
+    def __init__(self, max_workers=8, per_host=4, chunk_size=1024 * 1024, cover_size=0, tag_workers=2, tag_processes=False):
         self.session = requests.Session()
+        self.chunk_size = chunk_size
+        self.covers = CoverCache(self.session, max_size=cover_size)
+        self.max_workers = max_workers
+        self._mount_adapter(album_workers=1)
+        # 全局并发由线程池限制，单个 CDN 主机的并发由信号量限制
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        # 标签写入是独立的有界阶段，磁盘重写不再占用下载线程；CPU 紧张时可改用子进程
+        self.tag_pool = (ProcessPoolExecutor if tag_processes else ThreadPoolExecutor)(max_workers=tag_workers)
+        self._tag_slots = threading.BoundedSemaphore(tag_workers * 2)
+        self.stage_times = {'download': 0.0, 'tag': 0.0}
+        self.per_host = per_host
+        self._host_slots = {}
+        self._stats_lock = threading.Lock()
+        self.downloaded_bytes = 0
         self.cookies = {}
-        self.driver = None
-        self.chrome_options = self._init_chrome_options()
         self._prepare_environment()
 
-    def _init_chrome_options(self):
-        """初始化浏览器选项"""
-        options = Options()
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument("--headless")  # 无头模式
-        options.add_argument(f"user-agent={self._random_ua()}")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        return options
+    def _mount_adapter(self, album_workers):
+        """连接池按同时使用 session 的线程数设置：每个下载线程先后请求签名接口与 CDN，
+        每个并发专辑另有一个线程获取封面；池过小时多出的连接会被丢弃，无法复用"""
+        size = self.max_workers + album_workers
+        adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
     def _random_ua(self):
         """生成随机User-Agent"""
@@ -56,44 +128,16 @@ class NeteaseDownloader:
         self._login()
 
     def _login(self):
-        """通过浏览器获取有效Cookie"""
+        """获取有效Cookie：优先复用 cookie.txt，失效时才启动浏览器"""
         try:
-            # 使用webdriver-manager自动管理驱动
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(
-                service=service,
-                options=self.chrome_options
-            )
-            driver = webdriver.Chrome(options=self.chrome_options)
-            driver.get("https://music.163.com")
-
-            # 等待页面加载
-            time.sleep(5)
-            
-            # 检查登录状态
-            if "发现音乐" not in driver.page_source:
-                self._manual_login(driver)
-
-            # 获取Cookies
-            self.cookies = {c['name']: c['value'] for c in driver.get_cookies()}
-            logging.info("Cookie获取成功")
-
-            # 关闭浏览器
-            driver.quit()
+            self.cookies = CookieProvider(self.session).get(self._random_ua())
         except Exception as e:
             logging.error(f"登录失败: {str(e)}")
             raise
 
-    def _manual_login(self, driver):
-        """处理需要手动登录的情况"""
-        logging.warning("需要手动登录！")
-        driver.execute_script("document.querySelector('.link').click()")
-        input("请手动完成登录后按回车继续...")
-        time.sleep(5)  # 等待登录完成
-
     def _get_signed_url(self, song_id):
-        """获取带签名的真实下载地址"""
-        api_url = "https://music.163.com/api/song/enhance/player/url"
+        """获取带签名的真实下载地址，返回接口的 data 项（含 url、size）"""
+        api_url = f"{WEB_BASE}/api/song/enhance/player/url"
         params = {
             "id": song_id,
             "br": 999000,  # 音质参数
@@ -108,163 +152,290 @@ class NeteaseDownloader:
         }
 
         try:
+            limiter.acquire('url')
             response = self.session.get(
                 api_url,
                 params=params,
                 headers=headers,
                 timeout=30
             )
+            if is_throttled(response):
+                limiter.throttled('url', retry_after(response))
+                return None
+            limiter.success('url')
             data = response.json()
             if data['code'] == 200 and data['data'][0]['url']:
-                return data['data'][0]['url']
+                return data['data'][0]
             return None
         except Exception as e:
             logging.error(f"API请求失败: {str(e)}")
             return None
 
-    def _download_file(self, url, save_path):
-        """带反爬措施的下载函数"""
+    def _host_slot(self, url):
+        """获取目标主机的并发信号量"""
+        host = urlparse(url).netloc
+        with self._stats_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def _report(self, label, start_time, received):
+        """输出一段时间内的下载总量与平均速度"""
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+        mb = received / 1024 / 1024
+        logging.info(f"{label}: 下载 {mb:.2f} MB，用时 {elapsed:.1f}s，平均 {mb / elapsed:.2f} MB/s")
+
+    def _is_complete(self, path, expected_size=None):
+        """成品文件只在 .part 下载完整后才改名得到，存在且不小于预期大小即视为已完成"""
+        return path.exists() and (not expected_size or path.stat().st_size >= expected_size)
+
+    def _download_file(self, url, save_path, expected_size=None, expected_md5=None):
+        """带反爬措施的下载函数，返回 (是否成功, 本次下载的字节数)"""
+        with self._host_slot(url):
+            return self._fetch_file(url, save_path, expected_size, expected_md5)
+
+    def _hash_prefix(self, path, length):
+        """断点续传时补算已有部分的摘要"""
+        hasher = hashlib.md5()
+        with open(path, 'rb') as f:
+            while length > 0:
+                chunk = f.read(min(self.chunk_size, length))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                length -= len(chunk)
+        return hasher
+
+    def _fetch_file(self, url, save_path, expected_size=None, expected_md5=None):
         headers = {
             "User-Agent": self._random_ua(),
             "Referer": "https://music.163.com/",
             "Origin": "https://music.163.com",
-            "Accept-Encoding": "gzip, deflate, br",
+            # 断点续传按原始字节计算偏移，不接受压缩编码
+            "Accept-Encoding": "identity",
             "Cookie": "; ".join([f"{k}={v}" for k, v in self.cookies.items()])
         }
 
+        # 先写入 .part 文件，失败后用 Range 从断点继续，完整后才改名
+        part_path = save_path.with_name(save_path.name + '.part')
+        # 摘要随写入增量计算，跨重试保留，避免重新读取文件
+        hasher, hashed = hashlib.md5(), 0
+        # 本次调用实际收到的字节数，含失败重试，用于按专辑统计速度
+        received = 0
         for attempt in range(3):
             try:
-                response = self.session.get(
-                    url,
-                    headers=headers,
-                    stream=True,
-                    timeout=30
-                )
-                response.raise_for_status()
-
-                # 验证内容类型
-                content_type = response.headers.get('Content-Type', '')
-                if 'audio' not in content_type and 'octet-stream' not in content_type:
-                    raise ValueError(f"无效的音频类型: {content_type}")
-
-                # 分块下载
-                with open(save_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-
-                # 验证文件大小
-                if os.path.getsize(save_path) < 1024 * 100:  # 至少100KB
+                if part_path.exists():
+                    file_size = part_path.stat().st_size
+                else:
+                    # 首次下载，或上次因 416/大小/摘要校验失败已删除 .part，摘要从头计算
+                    file_size, hasher, hashed = 0, hashlib.md5(), 0
+                if expected_md5 and hashed != file_size:
+                    hasher, hashed = self._hash_prefix(part_path, file_size), file_size
+                if not (expected_size and file_size == expected_size):
+                    request_headers = dict(headers)
+                    if file_size:
+                        request_headers['Range'] = f"bytes={file_size}-"
+                    limiter.acquire('cdn')
+                    response = self.session.get(
+                        url,
+                        headers=request_headers,
+                        stream=True,
+                        timeout=30
+                    )
+                    if is_throttled(response, stream=True):
+                        # 退避由限流器统一安排，下次 acquire 时等待
+                        limiter.throttled('cdn', retry_after(response))
+                        raise ValueError(f"CDN 限流: HTTP {response.status_code}")
+                    limiter.success('cdn')
+                    if response.status_code == 416:
+                        # 断点超出文件范围，丢弃后重新下载
+                        part_path.unlink(missing_ok=True)
+                        raise ValueError("断点续传位置无效")
+                    response.raise_for_status()
+
+                    # 验证内容类型
+                    content_type = response.headers.get('Content-Type', '')
+                    if 'audio' not in content_type and 'octet-stream' not in content_type:
+                        raise ValueError(f"无效的音频类型: {content_type}")
+
+                    # 服务器不支持 Range 时从头下载
+                    if not (file_size and response.status_code == 206):
+                        file_size, hasher, hashed = 0, hashlib.md5(), 0
+
+                    # 分块下载
+                    with open(part_path, 'ab' if file_size else 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            f.write(chunk)
+                            hasher.update(chunk)
+                            file_size += len(chunk)
+                            hashed = file_size
+                            received += len(chunk)
+                            with self._stats_lock:
+                                self.downloaded_bytes += len(chunk)
+
+                # 验证文件大小与摘要
+                if expected_size and file_size != expected_size:
+                    if file_size > expected_size:
+                        part_path.unlink(missing_ok=True)
+                    raise ValueError(f"文件大小异常: {file_size}/{expected_size}")
+                if file_size < 1024 * 100:  # 至少100KB
+                    part_path.unlink(missing_ok=True)
                     raise ValueError("文件大小异常")
+                if expected_md5 and hasher.hexdigest() != expected_md5.lower():
+                    part_path.unlink(missing_ok=True)
+                    raise ValueError(f"MD5 校验失败: {hasher.hexdigest()}/{expected_md5}")
 
-                return True
+                os.replace(part_path, save_path)
+                return True, received
             except Exception as e:
                 logging.warning(f"下载失败（尝试{attempt+1}/3）: {str(e)}")
-                time.sleep(2 ** attempt)  # 指数退避
                 if attempt == 2:
-                    return False
-
-    def _process_metadata(self, file_path, metadata, cover_path):
-        """处理元数据"""
-        try:
-            if file_path.suffix.lower() == '.flac':
-                audio = FLAC(file_path)
-                audio.update({
-                    'title': metadata['title'],
-                    'artist': metadata['artist'],
-                    'album': metadata['album'],
-                    'tracknumber': str(metadata['track_num'])
-                })
-                if cover_path.exists():
-                    image = Picture()
-                    image.type = 3
-                    image.mime = 'image/jpeg'
-                    image.data = cover_path.read_bytes()
-                    audio.add_picture(image)
-                audio.save()
-            else:
-                audio = ID3(file_path) if file_path.exists() else ID3()
-                audio.add(TIT2(encoding=3, text=metadata['title']))
-                audio.add(TPE1(encoding=3, text=metadata['artist']))
-                audio.add(TALB(encoding=3, text=metadata['album']))
-                audio.add(TRCK(encoding=3, text=str(metadata['track_num'])))
-                if cover_path.exists():
-                    audio.add(APIC(
-                        encoding=0,
-                        mime='image/jpeg',
-                        type=3,
-                        desc='Cover',
-                        data=cover_path.read_bytes()
-                    ))
-                audio.save(file_path)
-        except Exception as e:
-            logging.error(f"元数据写入失败: {str(e)}")
+                    return False, received
+                time.sleep(backoff_delay(attempt + 1))  # 带抖动的指数退避
 
     def process_album(self, album_dir):
         """处理单个专辑"""
+        failed = self.process_records(album_dir, iter_records(album_dir))
+        # 只保留下载失败的记录，便于下次重试
+        write_records(album_dir, failed)
+
+    def process_records(self, album_dir, records):
+        """并发下载一组同专辑的歌曲记录，歌词文件从 album_dir 中取，返回下载失败的记录"""
         album_name = album_dir.name
         result_dir = Path('result') / album_name
         result_dir.mkdir(exist_ok=True)
+        start_time = time.monotonic()
+
+        # 同一首歌只下载一次，否则多个线程会写入同一个 .part 文件
+        records = unique_records(records)
+        # 封面按专辑只加载一次，所有歌曲共用同一份字节
+        pic_urls = dict.fromkeys(record.picUrl for record in records if record.picUrl)
+        cover_data = next((data for data in map(self.covers.get, pic_urls) if data), None)
+        if cover_data:
+            cover_path = result_dir / f"cover{cover_ext(cover_data)}"
+            if not cover_path.exists():
+                cover_path.write_bytes(cover_data)
+
+        futures = [
+            (record, self.pool.submit(self._process_track, album_dir, result_dir, cover_data, record))
+            for record in records
+        ]
+        failed = []
+        tag_futures = []
+        download_time = 0.0
+        # 只统计本专辑的字节，同时处理的其他专辑不计入
+        album_bytes = 0
+        for record, future in futures:
+            try:
+                ok, elapsed, received, tag_future = future.result()
+            except Exception as e:
+                logging.error(f"歌曲处理失败 [{record.title}]: {str(e)}")
+                ok, elapsed, received, tag_future = False, 0.0, 0, None
+            download_time += elapsed
+            album_bytes += received
+            if tag_future is not None:
+                tag_futures.append(tag_future)
+            if not ok:
+                failed.append(record)
+        tag_time = sum(future.result() for future in tag_futures if not future.exception())
+        self._report(f"专辑 {album_name}", start_time, album_bytes)
+        logging.info(f"专辑 {album_name} 阶段耗时（各线程累计）: 下载 {download_time:.1f}s，标签 {tag_time:.1f}s")
+        metrics.log_timer('album', time.monotonic() - start_time, album=album_name, songs=len(records), failed=len(failed))
+        return failed
+
+    def _submit_tags(self, audio_path, metadata, cover_data):
+        """把标签写入交给标签阶段；积压过多时阻塞下载线程形成背压"""
+        self._tag_slots.acquire()
+        try:
+            future = self.tag_pool.submit(write_tags, audio_path, metadata, cover_data)
+        except Exception:
+            self._tag_slots.release()
+            raise
 
-        # 下载专辑封面
-        cover_path = result_dir / 'cover.jpg'
-        if not cover_path.exists():
-            for temp_file in album_dir.glob('*.temp'):
-                with open(temp_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                if match := re.search(r'歌曲图片:\s*(.+?)\n', content):
-                    if self._download_file(match.group(1), cover_path):
-                        break
-
-        # 处理歌曲文件
-        for temp_file in album_dir.glob('*.temp'):
-            with open(temp_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            # 提取元数据
+        def done(future):
+            self._tag_slots.release()
+            if not future.exception():
+                with self._stats_lock:
+                    self.stage_times['tag'] += future.result()
+                metrics.log_timer('tag', future.result(), file=audio_path.name)
+        future.add_done_callback(done)
+        return future
+
+    def _process_track(self, album_dir, result_dir, cover_data, record):
+        """下载单曲，完成后交给标签阶段并移动歌词，返回 (是否成功, 下载耗时, 下载字节数, 标签任务)"""
+        # 获取真实下载地址；实际保存的文件按签名链接的格式与大小生成，跳过判断也以此为准
+        signed = self._get_signed_url(record.id)
+        if signed:
+            real_url, expected_size, expected_md5 = signed['url'], signed.get('size'), signed.get('md5')
+        else:
+            real_url, expected_size, expected_md5 = record.url, record.size, record.md5
+
+        # 生成文件名
+        safe_title = re.sub(r'[\\/*?:"<>|]', '_', record.title)
+        file_ext = Path(real_url).suffix.split('?')[0]
+        audio_path = result_dir / f"{record.track:02d} {safe_title}{file_ext}"
+
+        download_time, received = 0.0, 0
+        tag_future = None
+        if self._is_complete(audio_path, expected_size):
+            logging.info(f"文件已存在，跳过下载: {audio_path.name}")
+        else:
+            # 下载音频
+            start_time = time.monotonic()
+            ok, received = self._download_file(real_url, audio_path, expected_size, expected_md5)
+            download_time = time.monotonic() - start_time
+            with self._stats_lock:
+                self.stage_times['download'] += download_time
+            metrics.log_timer('download', download_time, song=record.id, ok=ok)
+            if not ok:
+                return False, download_time, received, None
+
+            # 处理元数据
             metadata = {
-                'title': re.search(r'歌曲名称:\s*(.+?)\n', content).group(1),
-                'artist': re.search(r'歌手:\s*(.+?)\n', content).group(1),
-                'album': re.search(r'专辑名称:\s*(.+?)\n', content).group(1),
-                'url': re.search(r'音乐链接:\s*(.+?)\n', content).group(1)
+                'title': record.title,
+                'artist': record.artists,
+                'album': record.album,
+                'track_num': record.track
             }
+            tag_future = self._submit_tags(audio_path, metadata, cover_data)
 
-            # 获取真实下载地址
-            song_id = re.search(r'song\?id=(\d+)', metadata['url']).group(1)
-            real_url = self._get_signed_url(song_id) or metadata['url']
+        # 移动歌词文件
+        for lrc_name in (record.lyric_path, record.tlyric_path):
+            if lrc_name and (album_dir / lrc_name).exists():
+                shutil.move(album_dir / lrc_name, result_dir / lrc_name)
+        return True, download_time, received, tag_future
 
-            # 生成文件名
-            track_num = int(temp_file.stem[:2])
-            safe_title = re.sub(r'[\\/*?:"<>|]', '_', metadata['title'])
-            file_ext = Path(real_url).suffix.split('?')[0]
-            audio_path = result_dir / f"{track_num:02d} {safe_title}{file_ext}"
+    def _run_album(self, album_dir):
+        try:
+            logging.info(f"开始处理专辑: {album_dir.name}")
+            self.process_album(album_dir)
+            # 清理空目录
+            try:
+                album_dir.rmdir()
+            except OSError:
+                pass
+        except Exception as e:
+            logging.error(f"专辑处理失败 [{album_dir.name}]: {str(e)}")
 
-            # 下载音频
-            if self._download_file(real_url, audio_path):
-                # 处理元数据
-                metadata['track_num'] = track_num
-                self._process_metadata(audio_path, metadata, cover_path)
-
-                # 移动歌词文件
-                for lrc in album_dir.glob(f"{track_num:02d} *.lrc"):
-                    shutil.move(lrc, result_dir / lrc.name)
-
-                temp_file.unlink()
-
-    def run(self):
-        """主运行逻辑"""
-        for album_dir in Path('temp').glob('*'):
-            if album_dir.is_dir():
-                try:
-                    logging.info(f"开始处理专辑: {album_dir.name}")
-                    self.process_album(album_dir)
-                    # 清理空目录
-                    try:
-                        album_dir.rmdir()
-                    except OSError:
-                        pass
-                except Exception as e:
-                    logging.error(f"专辑处理失败 [{album_dir.name}]: {str(e)}")
+    def run(self, album_workers=2):
+        """主运行逻辑，多个专辑同时处理，歌曲共享同一个下载线程池"""
+        start_time, start_bytes = time.monotonic(), self.downloaded_bytes
+        self._mount_adapter(album_workers)
+        album_dirs = [album_dir for album_dir in Path('temp').glob('*') if album_dir.is_dir()]
+        with ThreadPoolExecutor(max_workers=album_workers) as albums:
+            list(albums.map(self._run_album, album_dirs))
+        self._report("全部专辑", start_time, self.downloaded_bytes - start_bytes)
+        logging.info(f"全部专辑阶段耗时（各线程累计）: 下载 {self.stage_times['download']:.1f}s，标签 {self.stage_times['tag']:.1f}s")
 
 if __name__ == '__main__':
-    downloader = NeteaseDownloader()
-    downloader.run()
+    parser = argparse.ArgumentParser(description="下载 temp 目录中已解析的专辑")
+    parser.add_argument('--workers', type=int, default=8, help="同时下载的歌曲数，默认 8")
+    parser.add_argument('--per-host', type=int, default=4, help="单个 CDN 主机的最大并发数，默认 4")
+    parser.add_argument('--albums', type=int, default=2, help="同时处理的专辑数，默认 2")
+    parser.add_argument('--chunk-size', type=int, default=1024, help="下载写入的分块大小（KB），默认 1024")
+    parser.add_argument('--cover-size', type=int, default=0, help="封面最大边长（像素），0 表示保持原图；需要 Pillow")
+    parser.add_argument('--tag-workers', type=int, default=2, help="标签写入的并发数，默认 2")
+    parser.add_argument('--tag-processes', action='store_true', help="使用子进程写入标签")
+    args = parser.parse_args()
+    downloader = NeteaseDownloader(args.workers, args.per_host, args.chunk_size * 1024, args.cover_size, args.tag_workers, args.tag_processes)
+    downloader.run(args.albums)
@@ -0,0 +1,54 @@
+"""eapi 请求签名：复用密钥与 Cipher，负载只序列化一次，使用原生十六进制编码"""
+import json
+import urllib.parse
+from functools import lru_cache
+from hashlib import md5
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+AES_KEY = b"e82ckenh8dichen8"
+_SEPARATOR = "-36cd479b6b5-"
+_BLOCK = 16
+
+@lru_cache(maxsize=64)
+def api_path(url):
+    """eapi 地址对应的签名路径，如 /eapi/song/... -> /api/song/..."""
+    return urllib.parse.urlparse(url).path.replace("/eapi/", "/api/")
+
+def _pad(data):
+    pad = _BLOCK - len(data) % _BLOCK
+    return data + bytes([pad]) * pad
+
+class EapiSigner:
+    """eapi 参数加密器，可在线程间共享"""
+
+    def __init__(self, key=AES_KEY):
+        self._cipher = Cipher(algorithms.AES(key), modes.ECB())
+
+    def _plaintext(self, url, payload):
+        path = api_path(url)
+        body = json.dumps(payload)
+        digest = md5(f"nobody{path}use{body}md5forencrypt".encode("utf-8")).hexdigest()
+        return _pad(f"{path}{_SEPARATOR}{body}{_SEPARATOR}{digest}".encode())
+
+    def sign(self, url, payload):
+        """返回加密后的 params 十六进制字符串"""
+        encryptor = self._cipher.encryptor()
+        return (encryptor.update(self._plaintext(url, payload)) + encryptor.finalize()).hex()
+
+    def sign_batch(self, url, payloads):
+        """批量签名；ECB 按块独立加密，补齐后的多条明文可共用一个 encryptor"""
+        encryptor = self._cipher.encryptor()
+        signed = [encryptor.update(self._plaintext(url, payload)).hex() for payload in payloads]
+        encryptor.finalize()
+        return signed
+
+    def decrypt(self, params):
+        """解密 params，返回 (路径, 负载)；供本地测试服务使用"""
+        decryptor = self._cipher.decryptor()
+        data = decryptor.update(bytes.fromhex(params)) + decryptor.finalize()
+        text = data[:-data[-1]].decode()
+        path, body, _ = text.split(_SEPARATOR)
+        return path, json.loads(body)
+
+signer = EapiSigner()
@@ -0,0 +1,71 @@
+"""LRC 歌词解析：逐行线性扫描，不使用会回溯的正则"""
+from collections import namedtuple
+
+LyricLine = namedtuple('LyricLine', ['time', 'text', 'translation'])
+
+def parse_time(tag):
+    """解析 mm:ss.xx / mm:ss:xx / mm:ss 时间标签，返回毫秒；不是时间标签时返回 None"""
+    minutes, sep, rest = tag.partition(':')
+    if not sep or not minutes.isdigit():
+        return None
+    seconds, sep, fraction = rest.replace(':', '.', 1).partition('.')
+    if not seconds.isdigit() or (fraction and not fraction.isdigit()):
+        return None
+    millis = int(fraction.ljust(3, '0')[:3]) if fraction else 0
+    return (int(minutes) * 60 + int(seconds)) * 1000 + millis
+
+def format_time(ms):
+    return f"[{ms // 60000:02d}:{ms // 1000 % 60:02d}.{ms % 1000 // 10:02d}]"
+
+def parse_lrc(text):
+    """解析 LRC 文本，返回按时间排序的 [(毫秒, 歌词)]；一行带多个时间标签时展开为多行"""
+    lines = []
+    for raw in (text or '').splitlines():
+        pos = 0
+        stamps = []
+        while raw.startswith('[', pos):
+            end = raw.find(']', pos)
+            if end < 0:
+                break
+            ms = parse_time(raw[pos + 1:end])
+            if ms is None:
+                # [ar:...] 之类的信息标签
+                break
+            stamps.append(ms)
+            pos = end + 1
+        content = raw[pos:].strip()
+        for ms in stamps:
+            lines.append((ms, content))
+    # 歌词通常已按时间排列，Timsort 对有序输入是线性的
+    lines.sort(key=lambda line: line[0])
+    return lines
+
+def merge(lrc, tlyric=None):
+    """按时间戳单次归并原文与翻译，返回 [LyricLine]；时间戳按 LRC 的百分之一秒精度比较"""
+    original = parse_lrc(lrc)
+    translated = parse_lrc(tlyric)
+    merged = []
+    j = 0
+    for ms, content in original:
+        while j < len(translated) and translated[j][0] // 10 < ms // 10:
+            j += 1
+        translation = None
+        if j < len(translated) and translated[j][0] // 10 == ms // 10 and translated[j][1]:
+            translation = translated[j][1]
+        merged.append(LyricLine(ms, content, translation))
+    return merged
+
+def parse_lyric(lyricv1):
+    """直接解析 lyric_v1 的返回数据"""
+    return merge(
+        (lyricv1.get('lrc') or {}).get('lyric'),
+        (lyricv1.get('tlyric') or {}).get('lyric'),
+    )
+
+def write_lrc(path, lines, with_translation=False):
+    """写出 LRC 文件；with_translation 时译文与原文使用相同时间标签紧随其后"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(f"{format_time(line.time)}{line.text}\n")
+            if with_translation and line.translation:
+                f.write(f"{format_time(line.time)}{line.translation}\n")
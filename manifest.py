@@ -0,0 +1,74 @@
+"""专辑清单：每个专辑目录下一个 manifest.jsonl，每行记录一首歌曲"""
+import json
+import threading
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+_lock = threading.RLock()
+
+@dataclass
+class TrackRecord:
+    """analyser 与 downloader 之间传递的单曲记录"""
+    id: str
+    track: int
+    title: str
+    artists: list
+    album: str
+    picUrl: str
+    url: str
+    level: str
+    size: int
+    md5: str
+    lyric_path: str = None
+    tlyric_path: str = None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{f.name: data.get(f.name) for f in fields(cls)})
+
+def manifest_path(album_dir):
+    return Path(album_dir) / MANIFEST_NAME
+
+def append_record(album_dir, record):
+    """向专辑清单追加一条记录，多线程写入安全"""
+    line = json.dumps(asdict(record), ensure_ascii=False) + '\n'
+    with _lock:
+        with open(manifest_path(album_dir), 'a', encoding='utf-8') as f:
+            f.write(line)
+
+def unique_records(records):
+    """按歌曲 ID 去重，同一首歌以最后一条记录为准，顺序按首次出现"""
+    latest = {}
+    for record in records:
+        latest[record.id] = record
+    return list(latest.values())
+
+def iter_records(album_dir):
+    """读取专辑清单；重复解析或追加导致的同一首歌的多条记录只保留最后一条"""
+    path = manifest_path(album_dir)
+    if not path.exists():
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [TrackRecord.from_dict(json.loads(line)) for line in f if line.strip()]
+    yield from unique_records(records)
+
+def write_records(album_dir, records):
+    """用给定记录覆盖专辑清单，记录为空时删除清单"""
+    path = manifest_path(album_dir)
+    records = list(records)
+    with _lock:
+        if not records:
+            path.unlink(missing_ok=True)
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(asdict(record), ensure_ascii=False) + '\n')
+
+def discard_records(album_dir, song_ids):
+    """从专辑清单中移除指定歌曲的记录"""
+    song_ids = set(song_ids)
+    with _lock:
+        records = [record for record in iter_records(album_dir) if record.id not in song_ids]
+        write_records(album_dir, records)
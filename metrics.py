@@ -0,0 +1,332 @@
+"""运行指标：计数器、直方图与 Prometheus 文本格式输出，外加可在运行时开启的采样分析器
+
+指标保存在进程内。serve 模式多进程运行时，各工作进程通过 share() 每秒把自己的数值写入共享目录，
+/metrics 无论由哪个进程响应都输出所有进程的合计：计数器与直方图包括已退出的进程，仪表只计存活的进程。
+analyser 与 downloader 通过 stage_timer 同时记录直方图和一行 JSON 格式的耗时日志。
+"""
+import copy
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# 多进程共享目录；未设置时 prepare_shared() 新建一个临时目录
+METRICS_DIR_ENV = 'NETEASE_METRICS_DIR'
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class _Metric:
+    type_ = ''
+    # 累计值在进程退出后仍计入合计；仪表只反映存活进程的当前状态
+    cumulative = True
+
+    def __init__(self, name, help_, labelnames=()):
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def export(self):
+        """本进程的数值，可 JSON 序列化"""
+        with self._lock:
+            return [[list(key), copy.deepcopy(value)] for key, value in self._values.items()]
+
+    def _merge(self, total, value):
+        return total + value
+
+    def merged(self, exports=None):
+        """所有进程合计后的 {标签值元组: 数值}"""
+        values = {}
+        for alive, data in exports if exports is not None else _exports():
+            if not alive and not self.cumulative:
+                continue
+            for key, value in data.get(self.name, ()):
+                key = tuple(key)
+                values[key] = self._merge(values[key], value) if key in values else value
+        return values
+
+    def render(self, exports=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_}"]
+        for key, value in sorted(self.merged(exports).items()):
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_label_text(self.labelnames, key)} {value}"]
+
+class Counter(_Metric):
+    type_ = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    type_ = 'gauge'
+    cumulative = False
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def track(self, **labels):
+        """视图装饰器：执行期间计数加一"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                self.inc(**labels)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.dec(**labels)
+            return wrapper
+        return decorator
+
+class Histogram(_Metric):
+    type_ = 'histogram'
+
+    def __init__(self, name, help_, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _merge(self, total, value):
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1], total[2] + value[2]]
+
+    def _samples(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _label_text(self.labelnames + ('le',), key + (bound,))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _label_text(self.labelnames + ('le',), key + ('+Inf',))
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {count}")
+        return lines
+
+class Collected(_Metric):
+    """由组件的统计字典派生的单标签指标，导出时调用 func() 取得 {标签值: 数值}"""
+
+    def __init__(self, name, help_, type_, labelname, func):
+        super().__init__(name, help_, [labelname])
+        self.type_ = type_
+        self.cumulative = type_ == 'counter'
+        self.func = func
+
+    def export(self):
+        return [[[str(label)], value] for label, value in self.func().items()]
+
+registry = []
+
+UPSTREAM_SECONDS = Histogram('netease_upstream_seconds', "上游接口请求耗时（秒）", ['call'])
+SIGN_SECONDS = Histogram(
+    'netease_eapi_sign_seconds', "eapi 参数加密耗时（秒）",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005),
+)
+SONG_REQUESTS = Counter('netease_song_requests_total', "/Song_V1 请求数", ['level', 'type'])
+COLLECTION_REQUESTS = Counter('netease_collection_requests_total', "/Album_V1 与 /Playlist_V1 请求数", ['endpoint', 'level'])
+IN_FLIGHT = Gauge('netease_in_flight_requests', "正在处理的请求数", ['endpoint'])
+STAGE_SECONDS = Histogram('netease_stage_seconds', "analyser/downloader 各阶段耗时（秒）", ['stage'],
+                          buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+
+@contextmanager
+def timer(histogram, **labels):
+    """记录代码块耗时到直方图"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+def log_timer(stage, seconds, **fields):
+    """记录已测得的阶段耗时到 STAGE_SECONDS，并输出一行 JSON 日志，fields 只写入日志"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    logging.info(json.dumps({'timer': stage, 'seconds': round(seconds, 4), **fields}, ensure_ascii=False))
+
+@contextmanager
+def stage_timer(stage, **fields):
+    """测量代码块耗时并交给 log_timer"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        log_timer(stage, time.perf_counter() - start, **fields)
+
+def bounded_label(value, known):
+    """标签值限定在已知集合内，其余归为 other，避免客户端参数制造无限多的序列"""
+    return value if value in known else 'other'
+
+def sample_lines(name, help_, type_, samples, labelname):
+    """把 {标签值: 数值} 渲染成一组样本行，用于由统计字典派生的指标"""
+    lines = [f"# HELP {name} {help_}", f"# TYPE {name} {type_}"]
+    lines.extend(f'{name}{{{labelname}="{_escape(label)}"}} {value}' for label, value in samples.items())
+    return lines
+
+def render(extra_lines=()):
+    """Prometheus 文本格式，多进程共享时输出所有进程的合计"""
+    exports = _exports()
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render(exports))
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
+
+_shared_dir = None
+
+def _local_export():
+    return {metric.name: metric.export() for metric in registry}
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _exports():
+    """[(进程是否存活, {指标名: 数值})]；未共享时只有本进程"""
+    if _shared_dir is None:
+        return [(True, _local_export())]
+    own = flush()
+    exports = [(True, own)]
+    for name in os.listdir(_shared_dir):
+        pid, ext = os.path.splitext(name)
+        if ext != '.json' or not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            with open(os.path.join(_shared_dir, name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        exports.append((_alive(int(pid)), data))
+    return exports
+
+def prepare_shared(directory=None):
+    """在 fork 工作进程之前调用：准备共享目录并清除上次运行留下的数值，返回目录路径"""
+    directory = directory or os.environ.get(METRICS_DIR_ENV) or tempfile.mkdtemp(prefix='netease-metrics-')
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.json.tmp')):
+            os.remove(os.path.join(directory, name))
+    return directory
+
+def flush():
+    """把本进程的数值原子写入共享目录，返回写入的内容"""
+    data = _local_export()
+    if _shared_dir is not None:
+        path = os.path.join(_shared_dir, f"{os.getpid()}.json")
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    return data
+
+def share(directory, interval=1.0):
+    """在每个工作进程内调用：之后定期写出本进程的数值，其他进程读取的值最多滞后 interval 秒"""
+    global _shared_dir
+    _shared_dir = directory
+    flush()
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except OSError as e:
+                logging.warning(f"指标写入共享目录失败: {str(e)}")
+    threading.Thread(target=run, daemon=True, name='metrics-share').start()
+
+class SamplingProfiler:
+    """纯 Python 采样分析器：后台线程定期抓取所有线程的调用栈，输出折叠栈格式（可直接生成火焰图）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._stacks = _Tally()
+        self.samples = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.005):
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks.clear()
+            self.samples = 0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True, name='profiler')
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """停止采样，返回折叠栈文本"""
+        with self._lock:
+            if self._thread is not None:
+                self._stop.set()
+                self._thread.join()
+                self._thread = None
+            return self.collapsed()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def _run(self, interval):
+        own = threading.get_ident()
+        while not self._stop.wait(interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+profiler = SamplingProfiler()
@@ -0,0 +1,150 @@
+"""流水线入口：专辑展开 → 歌曲解析 → 下载
+
+三个阶段各占一个线程，通过有界队列衔接，第一张专辑解析完即可开始下载。
+指定 --checkpoint 时，解析结果同时写入 temp/<专辑>/manifest.jsonl，
+中断后可以用 downloader.py 继续下载。
+"""
+import argparse
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import analyser
+import core
+import spider
+from downloader import NeteaseDownloader
+from manifest import append_record, discard_records
+
+_DONE = object()
+
+def read_ready(path):
+    """读取并清空待处理专辑列表"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r+", encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip()]
+        f.seek(0)
+        f.truncate()
+    return urls
+
+def expand_stage(urls, out_queue, failed, workers):
+    """阶段一：并发展开专辑，跨专辑去重后以 (专辑内序号, 歌曲ID) 列表逐个放入队列"""
+    seen = set()
+    try:
+        # 分享短链接先批量展开
+        locations = core.resolve_short_links(urls)
+        targets = [locations.get(url) or url for url in urls]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for url, song_ids in zip(urls, pool.map(spider.process_album, targets)):
+                if not song_ids:
+                    failed.append(url)
+                    continue
+                # 保留每首歌在专辑中的原始序号，跨专辑去重后曲目号与文件名不会错位
+                tracks = []
+                for position, song_id in enumerate(song_ids, 1):
+                    if song_id not in seen:
+                        seen.add(song_id)
+                        tracks.append((position, song_id))
+                logging.info(f"专辑展开完成: {url}，新增 {len(tracks)} 首")
+                if tracks:
+                    out_queue.put((url, tracks))
+    finally:
+        out_queue.put(_DONE)
+
+def resolve_stage(in_queue, out_queue, level, batch_size, checkpoint):
+    """阶段二：逐专辑批量解析，按专辑目录分组后交给下载阶段"""
+    try:
+        while (item := in_queue.get()) is not _DONE:
+            url, indexed = item
+            # 每个专辑取一次，cookie.txt 更新后立即生效
+            cookies = core.cookie_store.get()
+            albums = {}
+            try:
+                for start in range(0, len(indexed), batch_size):
+                    for album_dir, record in analyser.resolve_batch(indexed[start:start + batch_size], level, cookies):
+                        albums.setdefault(album_dir, []).append(record)
+                        if checkpoint:
+                            append_record(album_dir, record)
+            except Exception as e:
+                logging.error(f"专辑解析失败 [{url}]: {str(e)}")
+            for album_dir, records in albums.items():
+                out_queue.put((album_dir, records))
+    finally:
+        out_queue.put(_DONE)
+
+def keep_records(album_dir, records, checkpoint):
+    """未完成下载的记录写入清单，之后可用 downloader.py 重试；checkpoint 模式下记录已在清单中"""
+    if not checkpoint:
+        for record in records:
+            append_record(album_dir, record)
+
+def download_stage(in_queue, checkpoint):
+    """阶段三：逐专辑下载；登录与前两个阶段同时进行"""
+    downloader = NeteaseDownloader()
+    while (item := in_queue.get()) is not _DONE:
+        album_dir, records = item
+        logging.info(f"开始处理专辑: {album_dir.name}")
+        try:
+            failed = downloader.process_records(album_dir, records)
+        except Exception as e:
+            logging.error(f"专辑处理失败 [{album_dir.name}]: {str(e)}")
+            keep_records(album_dir, records, checkpoint)
+            continue
+        except BaseException:
+            keep_records(album_dir, records, checkpoint)
+            raise
+        if checkpoint:
+            failed_ids = {record.id for record in failed}
+            discard_records(album_dir, [record.id for record in records if record.id not in failed_ids])
+        else:
+            # 失败的歌曲写入清单，之后可用 downloader.py 重试
+            keep_records(album_dir, failed, checkpoint)
+        # 清理空目录
+        try:
+            album_dir.rmdir()
+        except OSError:
+            pass
+
+def run(ready_path="ready.txt", workers=4, level='hires', batch_size=analyser.BATCH_SIZE, queue_size=4, checkpoint=False):
+    """运行整条流水线，返回展开失败的专辑链接"""
+    os.makedirs("temp", exist_ok=True)
+    urls = read_ready(ready_path)
+    failed = []
+    album_queue = queue.Queue(maxsize=queue_size)
+    track_queue = queue.Queue(maxsize=queue_size)
+
+    stages = [
+        threading.Thread(target=expand_stage, args=(urls, album_queue, failed, workers), name="expand"),
+        threading.Thread(target=resolve_stage, args=(album_queue, track_queue, level, batch_size, checkpoint), name="resolve"),
+    ]
+    for stage in stages:
+        stage.start()
+    try:
+        download_stage(track_queue, checkpoint)
+    except BaseException:
+        # 下载阶段异常退出（如登录失败）时取空队列，避免上游阶段阻塞；已解析的专辑写入清单而不是丢弃
+        while (item := track_queue.get()) is not _DONE:
+            keep_records(*item, checkpoint)
+        raise
+    finally:
+        for stage in stages:
+            stage.join()
+        # 展开失败的专辑写回待处理列表
+        if failed:
+            with open(ready_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(failed) + "\n")
+    logging.info(f"流水线处理完成，共 {len(urls)} 个专辑，展开失败 {len(failed)} 个")
+    return failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="专辑展开、解析、下载流水线")
+    parser.add_argument('--ready', default="ready.txt", help="待处理专辑列表文件，默认 ready.txt")
+    parser.add_argument('--workers', type=int, default=4, help="并发展开的专辑数，默认 4")
+    parser.add_argument('--batch-size', type=int, default=analyser.BATCH_SIZE, help=f"每批解析的歌曲数，默认 {analyser.BATCH_SIZE}")
+    parser.add_argument('--queue-size', type=int, default=4, help="阶段之间的队列长度，默认 4")
+    parser.add_argument('--level', default='hires', choices=['standard', 'exhigh', 'lossless', 'hires', 'sky', 'jyeffect', 'jymaster'], help="选择音质等级，默认是 hires")
+    parser.add_argument('--checkpoint', action='store_true', help="同时把解析结果写入 manifest.jsonl，便于中断后继续")
+    args = parser.parse_args()
+    run(args.ready, args.workers, args.level, args.batch_size, args.queue_size, args.checkpoint)
@@ -0,0 +1,196 @@
+"""上游限流：按接口类别的令牌桶，遇到限流响应时按 AIMD 调整速率并统一退避
+
+接口类别：url（eapi 播放链接）、detail（song/detail）、lyric、album、playlist、cdn（音频下载）。
+设置环境变量 NETEASE_RATE_DB 为一个 SQLite 文件路径后，同一台机器上的所有进程
+（core 的 serve 工作进程、analyser、spider、downloader）共享同一组令牌桶；未设置时只在进程内共享。
+"""
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+RATE_DB_ENV = 'NETEASE_RATE_DB'
+
+# rate 为初始（也是最大）每秒请求数，burst 为桶容量，min_rate 为乘性减小的下限
+Limit = namedtuple('Limit', ['rate', 'burst', 'min_rate'])
+
+DEFAULT_LIMITS = {
+    'url': Limit(50, 50, 2),
+    'detail': Limit(20, 20, 1),
+    'lyric': Limit(50, 50, 2),
+    'album': Limit(10, 10, 0.5),
+    'playlist': Limit(5, 5, 0.5),
+    'cdn': Limit(50, 50, 2),
+}
+
+# 连续限流时的退避时间：BACKOFF_BASE * 2^(n-1)，不超过 BACKOFF_MAX 秒
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# 网易云接口被限流时 HTTP 状态仍为 200，通过 JSON 中的 code（-460/-462）判断
+_THROTTLE_CODE = re.compile(rb'"code"\s*:\s*-46[02]\b')
+
+class ThrottledError(Exception):
+    """重试后仍被限流，调用方不应再追加请求"""
+
+def backoff_delay(strikes, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """第 strikes 次连续失败后的等待秒数，带随机抖动避免多个客户端同时重试"""
+    delay = min(maximum, base * 2 ** max(strikes - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+def is_throttled(response, stream=False):
+    """响应是否表示被限流；流式响应不读取内容，只看状态码"""
+    if response.status_code in (429, 503):
+        return True
+    if stream:
+        return False
+    return bool(_THROTTLE_CODE.search(response.content[:256]))
+
+def retry_after(response):
+    """Retry-After 头给出的秒数，没有或无法解析时返回 None"""
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+class _MemoryState:
+    """进程内的令牌桶状态"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+
+    @contextmanager
+    def transaction(self, family, initial):
+        with self._lock:
+            state = self._states.setdefault(family, dict(initial))
+            yield state
+
+    def snapshot(self):
+        with self._lock:
+            return {family: dict(state) for family, state in self._states.items()}
+
+class _SqliteState:
+    """SQLite 中的令牌桶状态，每次更新在一个写事务内完成，多进程共享安全"""
+
+    _FIELDS = ('tokens', 'updated', 'rate', 'strikes', 'blocked_until')
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ratelimit ("
+                "family TEXT PRIMARY KEY, tokens REAL, updated REAL, rate REAL, strikes INTEGER, blocked_until REAL)"
+            )
+
+    def _connect(self):
+        # 连接不能跨线程或跨 fork 使用，按 (线程, 进程) 各建一个
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self, family, initial):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated, rate, strikes, blocked_until FROM ratelimit WHERE family = ?", (family,)
+            ).fetchone()
+            state = dict(zip(self._FIELDS, row)) if row else dict(initial)
+            yield state
+            conn.execute(
+                "INSERT OR REPLACE INTO ratelimit VALUES (?, ?, ?, ?, ?, ?)",
+                (family, *(state[field] for field in self._FIELDS)),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def snapshot(self):
+        rows = self._connect().execute("SELECT family, tokens, updated, rate, strikes, blocked_until FROM ratelimit")
+        return {row[0]: dict(zip(self._FIELDS, row[1:])) for row in rows}
+
+class RateLimiter:
+    """按接口类别限流：成功时速率加性增加，限流时减半并让该类别的所有请求一起退避"""
+
+    def __init__(self, limits=None, path=None):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self._state = _SqliteState(path) if path else _MemoryState()
+        self.waited = 0.0
+        self.throttles = 0
+
+    def _initial(self, family):
+        limit = self.limits[family]
+        return {'tokens': float(limit.burst), 'updated': time.time(), 'rate': float(limit.rate),
+                'strikes': 0, 'blocked_until': 0.0}
+
+    def acquire(self, family):
+        """取得一个令牌，必要时等待；返回等待的秒数"""
+        if family not in self.limits:
+            return 0.0
+        limit = self.limits[family]
+        waited = 0.0
+        while True:
+            with self._state.transaction(family, self._initial(family)) as state:
+                now = time.time()
+                state['tokens'] = min(limit.burst, state['tokens'] + (now - state['updated']) * state['rate'])
+                state['updated'] = now
+                if now < state['blocked_until']:
+                    delay = state['blocked_until'] - now
+                elif state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    delay = 0.0
+                else:
+                    delay = (1 - state['tokens']) / state['rate']
+            if not delay:
+                self.waited += waited
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def success(self, family):
+        """请求成功：速率加性增加，大约每秒恢复 1 个请求/秒，直到配置的上限"""
+        if family not in self.limits:
+            return
+        limit = self.limits[family]
+        with self._state.transaction(family, self._initial(family)) as state:
+            state['rate'] = min(float(limit.rate), state['rate'] + 1 / state['rate'])
+            state['strikes'] = 0
+
+    def throttled(self, family, delay=None):
+        """被限流：速率减半，清空令牌，整个类别退避 delay（默认按连续次数指数增长）秒"""
+        if family not in self.limits:
+            return
+        limit = self.limits[family]
+        with self._state.transaction(family, self._initial(family)) as state:
+            now = time.time()
+            state['rate'] = max(float(limit.min_rate), state['rate'] / 2)
+            state['strikes'] += 1
+            state['tokens'] = 0.0
+            state['updated'] = now
+            delay = delay if delay is not None else backoff_delay(state['strikes'])
+            state['blocked_until'] = max(state['blocked_until'], now + delay)
+            rate = state['rate']
+        self.throttles += 1
+        logging.warning(f"{family} 接口被限流，速率降为 {rate:.1f}/秒，退避 {delay:.1f} 秒")
+
+    def stats(self):
+        snapshot = self._state.snapshot()
+        return {
+            'waited': round(self.waited, 3),
+            'throttles': self.throttles,
+            'rates': {family: round(state['rate'], 2) for family, state in snapshot.items()},
+        }
+
+limiter = RateLimiter(path=os.environ.get(RATE_DB_ENV))
@@ -0,0 +1,148 @@
+"""生产服务模式：预先 fork 多个工作进程共享监听端口，每个进程内用固定大小的线程池处理请求
+
+每个工作进程启动后调用一次 initializer，连接池、缓存与 Cookie 等进程内状态只在这里创建。
+收到 SIGTERM/SIGINT 时停止接收新连接，等待处理中的请求完成（最多 graceful_timeout 秒）后退出。
+不支持 fork 的平台（Windows）退化为单进程。
+"""
+import logging
+import os
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+class _RequestHandler(WSGIRequestHandler):
+    # 每个请求结束即关闭连接，空闲的长连接不会占住线程池
+    protocol_version = "HTTP/1.0"
+
+class PooledWSGIServer(BaseWSGIServer):
+    """把每个连接交给固定大小线程池处理的 WSGI 服务"""
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None, multiprocess=False):
+        self.multiprocess = multiprocess
+        super().__init__(host, port, app, handler=_RequestHandler, fd=fd)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="request")
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        future = self.executor.submit(self._handle, request, client_address)
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+
+    def _discard(self, future):
+        with self._pending_lock:
+            self._pending.discard(future)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self, timeout):
+        """等待处理中的请求完成，返回仍未完成的数量"""
+        with self._pending_lock:
+            pending = set(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        return len(not_done)
+
+def run_worker(app, host, port, threads, graceful_timeout, initializer=None, fd=None, multiprocess=False):
+    """运行单个工作进程，直到收到退出信号；返回超时后仍未完成的请求数"""
+    if initializer is not None:
+        initializer()
+    server = PooledWSGIServer(host, port, app, threads, fd=fd, multiprocess=multiprocess)
+
+    def stop(signum, frame):
+        # shutdown() 会等待 serve_forever 退出，不能在主线程的信号处理函数里直接调用
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logging.info(f"工作进程 {os.getpid()} 已启动，线程数 {threads}")
+    try:
+        server.serve_forever()
+    finally:
+        unfinished = server.drain(graceful_timeout)
+        server.server_close()
+        logging.info(f"工作进程 {os.getpid()} 已退出，未完成请求 {unfinished} 个")
+    return unfinished
+
+def serve(app, host='0.0.0.0', port=5000, workers=2, threads=16, backlog=128, graceful_timeout=30, initializer=None):
+    """启动服务；workers 个进程共享同一个监听 socket"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if workers > 1 and not hasattr(os, 'fork'):
+        logging.warning("当前平台不支持 fork，改为单进程运行")
+        workers = 1
+
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.create_server((host, port), family=family, backlog=backlog)
+    sock.set_inheritable(True)
+    logging.info(f"服务监听 {host}:{port}，进程数 {workers}，每进程线程数 {threads}，backlog {backlog}")
+
+    if workers <= 1:
+        unfinished = run_worker(app, host, port, threads, graceful_timeout, initializer, fd=sock.fileno())
+        if unfinished:
+            # 线程池的线程不是守护线程，解释器退出时会一直等它们；直接结束进程，graceful_timeout 才真正生效
+            logging.shutdown()
+            os._exit(0)
+        return
+
+    shutdown_signals = {signal.SIGTERM, signal.SIGINT}
+
+    def spawn():
+        # fork 前屏蔽退出信号：子进程先恢复默认处理再解除屏蔽，不会在安装自己的处理函数前执行主进程的 stop
+        signal.pthread_sigmask(signal.SIG_BLOCK, shutdown_signals)
+        try:
+            pid = os.fork()
+        except BaseException:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, shutdown_signals)
+            raise
+        if pid:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, shutdown_signals)
+            return pid
+        for signum in shutdown_signals:
+            signal.signal(signum, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, shutdown_signals)
+        code = 0
+        try:
+            run_worker(app, host, port, threads, graceful_timeout, initializer, fd=sock.fileno(), multiprocess=True)
+        except BaseException:
+            logging.exception("工作进程异常退出")
+            code = 1
+        finally:
+            os._exit(code)
+
+    children = {spawn() for _ in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # 主进程只负责监控：工作进程意外退出时补上，收到信号后等待全部退出
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logging.warning(f"工作进程 {pid} 意外退出，重新启动")
+            children.add(spawn())
+    sock.close()
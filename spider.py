@@ -1,6 +1,9 @@
+import argparse
 import re
-import requests
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+import core
 
 def extract_album_id(url):
     """从网易云专辑URL中提取专辑ID"""
@@ -10,16 +13,8 @@ def extract_album_id(url):
     return match.group(1)
 
 def get_album_data(album_id):
-    """通过网易云API获取专辑数据"""
-    api_url = f"https://music.163.com/api/album/{album_id}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Referer": "https://music.163.com/"
-    }
-    
-    response = requests.get(api_url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    """通过网易云API获取专辑数据；与 /Album_V1 共用 core.album_v1"""
+    return core.album_v1(album_id)
 
 def process_album(url):
     """处理单个专辑URL"""
@@ -37,17 +32,27 @@ def process_album(url):
         print(f"处理专辑失败 ({url}): {str(e)}")
         return None
 
+def read_queued_ids():
+    """读取 temp.txt 中已排队的歌曲ID"""
+    if not os.path.exists("temp.txt"):
+        return set()
+    with open("temp.txt", "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
 def update_temp_file(song_ids):
     """将歌曲ID追加到temp.txt"""
     with open("temp.txt", "a", encoding="utf-8") as f:
         f.write("\n".join(song_ids) + "\n")
 
-def main():
+def main(workers=4):
     # 确保ready.txt存在
     if not os.path.exists("ready.txt"):
         print("ready.txt 文件不存在")
         return
 
+    # 已在 temp.txt 中的歌曲不再重复加入
+    queued = read_queued_ids()
+
     # 读取待处理专辑列表
     with open("ready.txt", "r+", encoding="utf-8") as f:
         lines = [line.strip() for line in f if line.strip()]
@@ -56,23 +61,30 @@ def main():
         
         processed_count = 0
         
-        for url in lines:
-            # 处理专辑
-            song_ids = process_album(url)
-            
-            if song_ids:
-                # 写入temp.txt
-                update_temp_file(song_ids)
-                
-                # 显示处理信息
-                print(f"成功处理专辑: {url}")
-                print(f"提取到 {len(song_ids)} 首歌曲ID")
-                processed_count += 1
-            else:
-                # 保留处理失败的行
-                f.write(url + "\n")
+        # 分享短链接先批量展开，再并发获取专辑数据，按 ready.txt 的顺序汇总结果
+        locations = core.resolve_short_links(lines)
+        targets = [locations.get(url) or url for url in lines]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for url, song_ids in zip(lines, pool.map(process_album, targets)):
+                if song_ids:
+                    # 跨专辑去重后写入temp.txt
+                    new_ids = [song_id for song_id in dict.fromkeys(song_ids) if song_id not in queued]
+                    queued.update(new_ids)
+                    if new_ids:
+                        update_temp_file(new_ids)
+                    
+                    # 显示处理信息
+                    print(f"成功处理专辑: {url}")
+                    print(f"提取到 {len(song_ids)} 首歌曲ID，新增 {len(new_ids)} 首")
+                    processed_count += 1
+                else:
+                    # 保留处理失败的行
+                    f.write(url + "\n")
         
         print(f"处理完成，共成功处理 {processed_count} 个专辑")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="展开 ready.txt 中的专辑链接")
+    parser.add_argument('--workers', type=int, default=4, help="并发获取的专辑数，默认 4")
+    args = parser.parse_args()
+    main(args.workers)